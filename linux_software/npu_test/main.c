@@ -1,11 +1,13 @@
 #include <fcntl.h>
+#include <sched.h>
 #include <stdint.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <sys/mman.h>
 #include <sys/stat.h>
-#include <sys/time.h>
 #include <sys/types.h>
+#include <time.h>
 #include <unistd.h>
 
 // ==========================================
@@ -108,6 +110,179 @@ char get_char_polled() {
 #define NPU_MAT_BYTES (NPU_MAT_SIZE * 8)
 #define NPU_OUT_BYTES (NPU_MAT_SIZE * 32)
 
+// ==========================================
+// Timing & Stage Instrumentation
+// ==========================================
+
+static inline uint64_t now_ns() {
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (uint64_t)ts.tv_sec * 1000000000ull + (uint64_t)ts.tv_nsec;
+}
+
+typedef enum {
+  STAGE_FORMAT = 0, // CPU formatting into the DDR window
+  STAGE_PUSH,       // npu_ctrl writes + MSGDMA descriptor push
+  STAGE_WEIGHT_DMA, // weight stream until read MSGDMA / sequencer idle
+  STAGE_INPUT_DMA,  // input stream until read MSGDMA idle
+  STAGE_COMPUTE,    // remaining pipeline drain until write MSGDMA idle
+  STAGE_PARSE,      // CPU parsing of the output window
+  STAGE_COUNT
+} npu_stage_t;
+
+static const char *npu_stage_names[STAGE_COUNT] = {
+    "format", "push", "weight_dma", "input_dma", "compute", "parse"};
+
+// Rolling window of the most recent samples per stage (p50/p99 on demand)
+#define STAGE_WINDOW 1024
+
+typedef struct {
+  uint64_t samples[STAGE_WINDOW];
+  uint32_t head;
+  uint32_t filled;
+  uint64_t total_count;
+  uint64_t max_ns;
+} stage_hist_t;
+
+static stage_hist_t npu_stage_hist[STAGE_COUNT];
+
+void npu_stage_record(npu_stage_t stage, uint64_t ns) {
+  stage_hist_t *h = &npu_stage_hist[stage];
+  h->samples[h->head] = ns;
+  h->head = (h->head + 1) % STAGE_WINDOW;
+  if (h->filled < STAGE_WINDOW)
+    h->filled++;
+  h->total_count++;
+  if (ns > h->max_ns)
+    h->max_ns = ns;
+}
+
+// Records the time since *mark into `stage` and advances the mark
+static inline void npu_stage_lap(npu_stage_t stage, uint64_t *mark) {
+  uint64_t t = now_ns();
+  npu_stage_record(stage, t - *mark);
+  *mark = t;
+}
+
+static int cmp_u64(const void *a, const void *b) {
+  uint64_t x = *(const uint64_t *)a, y = *(const uint64_t *)b;
+  return (x > y) - (x < y);
+}
+
+void npu_stage_reset() { memset(npu_stage_hist, 0, sizeof(npu_stage_hist)); }
+
+void npu_stage_report() {
+  static uint64_t sorted[STAGE_WINDOW];
+
+  printf("\n=== Per-Stage Latency (last %d samples, us) ===\n", STAGE_WINDOW);
+  printf("%-11s %8s %10s %10s %10s\n", "stage", "count", "p50", "p99", "max");
+  for (int s = 0; s < STAGE_COUNT; s++) {
+    stage_hist_t *h = &npu_stage_hist[s];
+    if (h->filled == 0)
+      continue;
+    memcpy(sorted, h->samples, h->filled * sizeof(uint64_t));
+    qsort(sorted, h->filled, sizeof(uint64_t), cmp_u64);
+    uint64_t p50 = sorted[(h->filled - 1) / 2];
+    uint64_t p99 = sorted[((uint64_t)(h->filled - 1) * 99) / 100];
+    printf("%-11s %8llu %10.3f %10.3f %10.3f\n", npu_stage_names[s],
+           (unsigned long long)h->total_count, p50 / 1000.0, p99 / 1000.0,
+           h->max_ns / 1000.0);
+  }
+}
+
+// ==========================================
+// Adaptive Completion Waiting
+// ==========================================
+
+// Streaming model: the serializer emits 4 flits per output row at 50MHz,
+// plus the skew / de-skew pipeline fill of the 8x8 array.
+#define NPU_CLK_NS 20
+#define NPU_CYCLES_PER_ROW 4
+#define NPU_PIPELINE_CYCLES (4 * NPU_MAT_SIZE)
+
+#define NPU_SPIN_ONLY_NS 50000ull     // jobs predicted below this: pure spin
+#define NPU_WAKE_MARGIN_NS 20000ull   // wake this early from the first sleep
+#define NPU_BACKOFF_MIN_NS 1000ull    // first backoff sleep after a missed wake
+#define NPU_BACKOFF_MAX_NS 1000000ull // backoff cap (1ms, or predicted / 16)
+#define NPU_TIMEOUT_MIN_NS 100000000ull // never time out before 100ms
+#define NPU_TIMEOUT_FACTOR 16           // or 16x the predicted time
+
+// Measured ns per streamed row (EWMA), seeded from the cycle model
+static uint64_t npu_ns_per_row = NPU_CYCLES_PER_ROW * NPU_CLK_NS;
+
+uint64_t npu_predict_ns(uint32_t rows) {
+  return NPU_PIPELINE_CYCLES * NPU_CLK_NS + (uint64_t)rows * npu_ns_per_row;
+}
+
+// Feed back a measured streaming time so later predictions track the board.
+// Only pass samples where the wait saw the device finish (see npu_wait_idle):
+// a wait that slept past the completion measures the sleep, not the NPU.
+void npu_calibrate(uint32_t rows, uint64_t elapsed_ns) {
+  if (rows < 64)
+    return; // short jobs are dominated by fixed overhead
+  uint64_t measured = elapsed_ns / rows;
+  npu_ns_per_row = (npu_ns_per_row * 7 + measured) / 8;
+}
+
+static void sleep_ns(uint64_t ns) {
+  struct timespec ts = {(time_t)(ns / 1000000000ull),
+                        (long)(ns % 1000000000ull)};
+  nanosleep(&ts, NULL);
+}
+
+// Waits until (reg & mask) == 0. Short jobs spin; long jobs sleep until just
+// before the predicted completion, then poll with exponential backoff and
+// sched_yield. Returns 0 on completion, -1 on timeout. If `exact` is non-NULL
+// it is set when the return time is a usable completion sample: a spin-only
+// wait, or a sleep after which the first poll still saw the device busy.
+int npu_wait_idle(volatile uint8_t *base, uint32_t offset, uint32_t mask,
+                  uint64_t predicted_ns, int *exact) {
+  uint64_t start = now_ns();
+  if (exact)
+    *exact = 0;
+  uint64_t timeout = predicted_ns * NPU_TIMEOUT_FACTOR;
+  if (timeout < NPU_TIMEOUT_MIN_NS)
+    timeout = NPU_TIMEOUT_MIN_NS;
+
+  if (predicted_ns <= NPU_SPIN_ONLY_NS) {
+    while ((IORD_32DIRECT(base, offset) & mask) != 0) {
+      if (now_ns() - start > timeout)
+        return -1;
+    }
+    if (exact)
+      *exact = 1;
+    return 0;
+  }
+
+  if ((IORD_32DIRECT(base, offset) & mask) == 0)
+    return 0;
+  sleep_ns(predicted_ns - NPU_WAKE_MARGIN_NS);
+  if ((IORD_32DIRECT(base, offset) & mask) == 0)
+    return 0; // finished during the sleep: overslept, not a sample
+  if (exact)
+    *exact = 1;
+
+  // Keep the backoff small against the job so a late poll adds little latency
+  uint64_t backoff_max = predicted_ns / 16;
+  if (backoff_max > NPU_BACKOFF_MAX_NS)
+    backoff_max = NPU_BACKOFF_MAX_NS;
+  uint64_t backoff = NPU_BACKOFF_MIN_NS;
+  uint64_t spin_until = now_ns() + 2 * NPU_WAKE_MARGIN_NS;
+  while ((IORD_32DIRECT(base, offset) & mask) != 0) {
+    uint64_t t = now_ns();
+    if (t - start > timeout)
+      return -1;
+    if (t < spin_until)
+      continue; // expected to finish within the wake margin: keep spinning
+    sched_yield();
+    sleep_ns(backoff);
+    backoff *= 2;
+    if (backoff > backoff_max)
+      backoff = backoff_max;
+  }
+  return 0;
+}
+
 // ==========================================
 // Data Formatting API
 // ==========================================
@@ -159,22 +334,33 @@ void npu_parse_output(volatile uint8_t *src_addr, uint32_t dst_matrix[8][8]) {
 // NPU Control API
 // ==========================================
 
-void npu_load_weights(uint32_t weights_addr, int num_matrices) {
+int npu_load_weights(uint32_t weights_addr, int num_matrices) {
+  uint64_t mark = now_ns();
   IOWR(NPU_CTRL_BASE, REG_CTRL, 0x00000003);
 
   msgdma_read_stream_push(DDR_READ_ST_DESCRIPTOR_SLAVE_BASE, weights_addr,
                           NPU_MAT_BYTES * num_matrices);
+  npu_stage_lap(STAGE_PUSH, &mark);
+
+  uint64_t predicted = npu_predict_ns(NPU_MAT_SIZE * num_matrices);
 
   // Wait for MSGDMA Read Status to be Idle (Bit 0 != 1)
-  while ((IORD_32DIRECT(DDR_READ_ST_CSR_BASE, 0) & 0x01) != 0) {
+  if (npu_wait_idle(DDR_READ_ST_CSR_BASE, 0, 0x01, predicted, NULL) != 0) {
+    printf("[ERROR] Timeout waiting for weight MSGDMA\n");
+    return -1;
   }
 
   // Wait for NPU Sequencer Busy Flag (REG_STATUS Bit 0) to be idle.
-  while ((IORD(NPU_CTRL_BASE, REG_STATUS) & 0x01) != 0) {
+  if (npu_wait_idle(NPU_CTRL_BASE, REG_STATUS * 4, 0x01, predicted, NULL) !=
+      0) {
+    printf("[ERROR] Timeout waiting for NPU sequencer\n");
+    return -1;
   }
+  npu_stage_lap(STAGE_WEIGHT_DMA, &mark);
 
   IOWR(NPU_CTRL_BASE, 7, 1);
   IOWR(NPU_CTRL_BASE, 7, 0);
+  return 0;
 }
 
 void npu_get_matrix(uint32_t dst_addr, int num_matrices) {
@@ -188,14 +374,41 @@ void npu_load_matrix(uint32_t inputs_addr, int num_matrices) {
                           NPU_MAT_BYTES * num_matrices);
 }
 
-void npu_wait_execution() {
+// Waits for an execution of `num_matrices` 8x8 inputs that was just pushed.
+// Splits the wait into the input stream and the output drain for the stage
+// histograms, and feeds the measured time back into the row prediction.
+int npu_wait_execution(int num_matrices) {
+  uint32_t rows = NPU_MAT_SIZE * num_matrices;
+  uint64_t predicted = npu_predict_ns(rows);
+  uint64_t start = now_ns();
+  uint64_t mark = start;
+  int exact;
+
+  // The input stream finishes a pipeline depth before the last output row
+  if (npu_wait_idle(DDR_READ_ST_CSR_BASE, 0, 0x01, predicted, &exact) != 0) {
+    printf("[ERROR] Timeout waiting for input MSGDMA (%u rows)\n", rows);
+    return -1;
+  }
+  npu_stage_lap(STAGE_INPUT_DMA, &mark);
+
   // Wait for MSGDMA Write Status to be Idle
-  while ((IORD_32DIRECT(DDR_WRITE_ST_CSR_BASE, 0) & 0x01) != 0) {
+  if (npu_wait_idle(DDR_WRITE_ST_CSR_BASE, 0, 0x01,
+                    npu_predict_ns(0), NULL) != 0) {
+    printf("[ERROR] Timeout waiting for output MSGDMA (%u rows)\n", rows);
+    return -1;
   }
 
   // Wait for NPU Sequencer Busy Flag
-  while ((IORD(NPU_CTRL_BASE, REG_STATUS) & 0x01) != 0) {
+  if (npu_wait_idle(NPU_CTRL_BASE, REG_STATUS * 4, 0x01, npu_predict_ns(0),
+                    NULL) != 0) {
+    printf("[ERROR] Timeout waiting for NPU sequencer\n");
+    return -1;
   }
+  npu_stage_lap(STAGE_COMPUTE, &mark);
+
+  if (exact)
+    npu_calibrate(rows, mark - start);
+  return 0;
 }
 
 // ==========================================
@@ -247,14 +460,16 @@ void verify_full_system() {
   npu_format_inputs(inputs_addr, test_inputs);
 
   printf("Phase 1: Loading Weights via MSGDMA API...\n");
-  npu_load_weights(physical_base, 1);
+  if (npu_load_weights(physical_base, 1) != 0)
+    return;
   printf("Weights Loaded!\n");
 
   printf("Phase 2: Execution via MSGDMA API...\n");
   npu_get_matrix(physical_base + 0x2000, 1);
   npu_load_matrix(physical_base + 0x1000, 1);
 
-  npu_wait_execution();
+  if (npu_wait_execution(1) != 0)
+    return;
   printf("Execution Finished!\n\n");
 
   int errors = 0;
@@ -337,7 +552,8 @@ void verify_streaming_batch() {
   }
 
   printf("Loading Weights...\n");
-  npu_load_weights(physical_base, 1);
+  if (npu_load_weights(physical_base, 1) != 0)
+    return;
 
   printf("Firing 10-Batch Streaming Pipeline...\n");
 
@@ -346,7 +562,8 @@ void verify_streaming_batch() {
   npu_get_matrix(physical_base + 0x200000, 10);
   npu_load_matrix(physical_base + 0x100000, 10);
 
-  npu_wait_execution();
+  if (npu_wait_execution(10) != 0)
+    return;
 
   int total_errors = 0;
   for (int i = 0; i < 10; i++) {
@@ -450,12 +667,8 @@ void cpu_matmul_8x8(signed char A[8][8], signed char B[8][8], int32_t C[8][8]) {
   }
 }
 
-// Timing helper
-double get_time_us() {
-  struct timeval tv;
-  gettimeofday(&tv, NULL);
-  return (double)tv.tv_sec * 1000000.0 + (double)tv.tv_usec;
-}
+// Timing helper (monotonic, unaffected by wall-clock adjustments)
+double get_time_us() { return now_ns() / 1000.0; }
 
 void verify_performance_cpu_vs_npu(int batch_count) {
   if (batch_count <= 0) {
@@ -492,16 +705,18 @@ void verify_performance_cpu_vs_npu(int batch_count) {
   signed char (*input_matrices)[8][8] =
       malloc(batch_count * sizeof(*input_matrices));
   int32_t (*cpu_output)[8][8] = malloc(batch_count * sizeof(*cpu_output));
+  uint32_t (*hw_output)[8][8] = malloc(batch_count * sizeof(*hw_output));
 
-  if (!input_matrices || !cpu_output) {
+  if (!input_matrices || !cpu_output || !hw_output) {
     printf("Failed to allocate memory for matrices.\n");
-    if (input_matrices)
-      free(input_matrices);
-    if (cpu_output)
-      free(cpu_output);
+    free(input_matrices);
+    free(cpu_output);
+    free(hw_output);
     return;
   }
 
+  npu_stage_reset();
+
   for (int r = 0; r < 8; r++) {
     for (int c = 0; c < 8; c++) {
       weight_matrix[r][c] = (rand() % 256) - 128;
@@ -517,10 +732,12 @@ void verify_performance_cpu_vs_npu(int batch_count) {
   }
 
   // Formatting and loading to DDR for NPU
+  uint64_t mark = now_ns();
   npu_format_weights(weights_addr, weight_matrix);
   for (int b = 0; b < batch_count; b++) {
     npu_format_inputs(inputs_addr + b * NPU_MAT_BYTES, input_matrices[b]);
   }
+  npu_stage_lap(STAGE_FORMAT, &mark);
 
   // 2. Profile CPU Execution Time
   double cpu_start = get_time_us();
@@ -537,28 +754,44 @@ void verify_performance_cpu_vs_npu(int batch_count) {
   double cpu_duration = cpu_end - cpu_start;
 
   // 3. Profile NPU Execution Time (Include DMA Setup overhead)
-  npu_load_weights(physical_base, 1); // pre-load once
+  int npu_failed = npu_load_weights(physical_base, 1); // pre-load once
 
   double npu_start = get_time_us();
+  mark = now_ns();
   // Batch Execution Request
-  IOWR(NPU_CTRL_BASE, REG_SEQ_ROWS, batch_count * 8);
-  npu_get_matrix(physical_base + 0x200000, batch_count);
-  npu_load_matrix(physical_base + 0x100000, batch_count);
+  if (!npu_failed) {
+    IOWR(NPU_CTRL_BASE, REG_SEQ_ROWS, batch_count * 8);
+    npu_get_matrix(physical_base + 0x200000, batch_count);
+    npu_load_matrix(physical_base + 0x100000, batch_count);
+    npu_stage_lap(STAGE_PUSH, &mark);
+  }
 
   // Wait for completion
-  npu_wait_execution();
+  if (!npu_failed)
+    npu_failed = npu_wait_execution(batch_count);
   double npu_end = get_time_us();
   double npu_duration = npu_end - npu_start;
 
+  if (npu_failed) {
+    printf("NPU execution failed, skipping verification.\n");
+    free(input_matrices);
+    free(cpu_output);
+    free(hw_output);
+    return;
+  }
+
+  mark = now_ns();
+  for (int b = 0; b < batch_count; b++) {
+    npu_parse_output(outputs_addr + b * NPU_OUT_BYTES, hw_output[b]);
+  }
+  npu_stage_lap(STAGE_PARSE, &mark);
+
   // 4. Verify Correctness
   int total_errors = 0;
   for (int b = 0; b < batch_count; b++) {
-    uint32_t hw_matrix[8][8];
-    npu_parse_output(outputs_addr + b * NPU_OUT_BYTES, hw_matrix);
-
     for (int r = 0; r < 8; r++) {
       for (int c = 0; c < 8; c++) {
-        uint32_t hw_val = hw_matrix[r][c];
+        uint32_t hw_val = hw_output[b][r][c];
         uint32_t cpu_val = (uint32_t)cpu_output[b][r][c];
         if (hw_val != cpu_val) {
           if (total_errors < 5) {
@@ -586,8 +819,11 @@ void verify_performance_cpu_vs_npu(int batch_count) {
     printf("Speedup  : %.2f x\n", cpu_duration / npu_duration);
   }
 
+  npu_stage_report();
+
   free(input_matrices);
   free(cpu_output);
+  free(hw_output);
 }
 
 // ----------------------------------------------------------------------------
@@ -632,6 +868,7 @@ int main() {
     printf("2. Verify Full System Data path\n");
     printf("3. Verify Streaming Pipeline (N Batches)\n");
     printf("4. CPU vs NPU Performance Comparison\n");
+    printf("5. Show Per-Stage Latency Statistics\n");
     printf("q. Quit\n");
     printf("Choose: ");
 
@@ -655,6 +892,8 @@ int main() {
         while (getchar() != '\n')
           ;
       }
+    } else if (c == '5') {
+      npu_stage_report();
     } else if (c == 'q') {
       printf("Exiting...\n");
       break;
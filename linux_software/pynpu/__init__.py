@@ -0,0 +1,32 @@
+"""
+pynpu: Python host runtime for the DE10-Nano NPU.
+
+    hw        register map, DDR window layout and data formatting
+    device    DevMemDevice (/dev/mem on the board) and the in-process Emulator
+    driver    MSGDMA / npu_ctrl control API (port of npu_test/main.c)
+    compiler  ahead-of-time lowering of Linear/Conv2d graphs to execution plans
+    plan      versioned, memory-mapped execution plan files
+    mlp       fused Linear chains with activations resident in the DMA window
+    hybrid    batched matmul split between the NPU and a NumPy worker thread
+    broker    multi-process device owner serving jobs over shared-memory rings
+"""
+from .broker import Broker, BrokerClient
+from .compiler import Conv2d, Linear, compile_graph
+from .device import DevMemDevice, Emulator
+from .hybrid import HybridMatmul
+from .mlp import MLPExecutor
+from .plan import ExecutionPlan, load_plan
+
+__all__ = [
+    "Broker",
+    "BrokerClient",
+    "Conv2d",
+    "DevMemDevice",
+    "Emulator",
+    "ExecutionPlan",
+    "HybridMatmul",
+    "Linear",
+    "MLPExecutor",
+    "compile_graph",
+    "load_plan",
+]
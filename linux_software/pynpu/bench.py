@@ -0,0 +1,226 @@
+"""
+Reproducible CPU vs NPU matmul benchmark with shape sweeps and regression tracking.
+
+Backends:
+    cpu        NumPy int32 matmul on the host (the baseline)
+    model      pynpu.cycle_model estimate at the 50MHz NPU clock (per stall profile)
+    emulator   ExecutionPlan on the in-process Emulator (host-side overhead only)
+    hardware   ExecutionPlan on /dev/mem (opt-in, and only on a DE10-Nano)
+
+    python -m pynpu.bench run --out results.json
+    python -m pynpu.bench run --backends cpu,model,emulator,hardware   # on the board
+    python -m pynpu.bench compare baseline.json results.json --threshold 0.10
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from . import cycle_model, driver, hw, ops
+from .compiler import Linear, compile_graph
+from .device import DevMemDevice, Emulator
+
+RESULTS_VERSION = 1
+DEVICE_TREE_MODEL = "/proc/device-tree/model"
+BOARD_MODEL = "DE10-Nano"
+DEFAULT_BACKENDS = ("cpu", "model", "emulator")
+
+DEFAULT_SHAPES = [(8, 8), (32, 32), (64, 64)]
+DEFAULT_ROWS = [8, 512, 4096]
+STALL_PROFILES = {
+    "none": [1],
+    "half": [1, 0],
+    "bursty": [1] * 16 + [0] * 16,
+    "sparse": [1, 0, 0, 0],
+}
+
+
+def traffic_bytes(k, n, rows):
+    """Bytes moved over the MSGDMA streams for one (rows, K) x (K, N) matmul."""
+    tiles = ops.num_tiles(k) * ops.num_tiles(n)
+    return tiles * (hw.NPU_MAT_BYTES + rows * (hw.NPU_ROW_BYTES + hw.NPU_OUT_ROW_BYTES))
+
+
+def _time(fn, repeats):
+    """Median wall time of `repeats` calls after one warm-up call."""
+    result = fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    return float(np.median(samples)) / 1e9, result
+
+
+def _record(backend, k, n, rows, stall, latency_s, verified=None):
+    macs = rows * k * n
+    return {
+        "backend": backend, "k": k, "n": n, "rows": rows, "stall": stall,
+        "latency_s": latency_s,
+        "macs_per_s": macs / latency_s if latency_s > 0 else None,
+        "bytes_moved": traffic_bytes(k, n, rows) if backend != "cpu" else None,
+        "verified": verified,
+    }
+
+
+def board_present():
+    """True only on the DE10-Nano: /dev/mem on any other host maps unrelated physical memory."""
+    try:
+        with open(DEVICE_TREE_MODEL, "rb") as f:
+            return BOARD_MODEL.encode() in f.read()
+    except OSError:
+        return False
+
+
+def open_hardware():
+    if not board_present():
+        print(f"hardware backend skipped: {DEVICE_TREE_MODEL} does not name a {BOARD_MODEL}",
+              file=sys.stderr)
+        return None
+    try:
+        return DevMemDevice()
+    except OSError as e:
+        print(f"hardware backend skipped: {e}", file=sys.stderr)
+        return None
+
+
+def run_suite(shapes=DEFAULT_SHAPES, rows_list=DEFAULT_ROWS, stalls=STALL_PROFILES,
+              repeats=5, seed=2026, backends=DEFAULT_BACKENDS):
+    rng = np.random.default_rng(seed)
+    devices = {}
+    if "emulator" in backends:
+        devices["emulator"] = Emulator()
+    if "hardware" in backends:
+        dev = open_hardware()
+        if dev is not None:
+            devices["hardware"] = dev
+
+    results = []
+    skipped = []
+    for k, n in shapes:
+        w = rng.integers(-128, 128, size=(k, n), dtype=np.int16).astype(np.int8)
+        for rows in rows_list:
+            x = rng.integers(-128, 128, size=(rows, k), dtype=np.int16).astype(np.int8)
+            expected = hw.golden_matmul(x, w)
+
+            if "cpu" in backends:
+                latency, _ = _time(lambda: hw.golden_matmul(x, w), repeats)
+                results.append(_record("cpu", k, n, rows, "none", latency))
+
+            if "model" in backends:
+                for name, pattern in stalls.items():
+                    results.append(_record("model", k, n, rows, name,
+                                           cycle_model.model_latency(k, n, rows, pattern)))
+
+            if not devices:
+                continue
+            try:
+                plan = compile_graph([Linear(w)], input_shape=(k,), batch=rows)
+            except ValueError as e:
+                skipped.append({"k": k, "n": n, "rows": rows, "reason": str(e)})
+                continue
+            for name, dev in devices.items():
+                plan.stage(dev)
+                latency, got = _time(lambda: plan.run(dev, x), repeats)
+                results.append(_record(name, k, n, rows, "none", latency,
+                                       verified=bool(np.array_equal(got, expected))))
+
+    for dev in devices.values():
+        dev.close()
+
+    return {
+        "version": RESULTS_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"node": platform.node(), "machine": platform.machine(),
+                 "python": platform.python_version(), "numpy": np.__version__},
+        "config": {"shapes": [list(s) for s in shapes], "rows": list(rows_list),
+                   "stalls": list(stalls), "repeats": repeats, "seed": seed},
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def _key(r):
+    return (r["backend"], r["k"], r["n"], r["rows"], r["stall"])
+
+
+def compare(baseline, current, threshold=0.10):
+    """Return results whose latency grew by more than `threshold` (fractional) over the baseline."""
+    base = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get(_key(r))
+        if b is None or b["latency_s"] <= 0:
+            continue
+        ratio = r["latency_s"] / b["latency_s"]
+        if ratio > 1.0 + threshold:
+            regressions.append({**r, "baseline_latency_s": b["latency_s"], "slowdown": ratio})
+    return regressions
+
+
+def format_table(report):
+    lines = [f"{'backend':<9} {'K':>4} {'N':>4} {'rows':>6} {'stall':<7} "
+             f"{'latency(us)':>12} {'MMAC/s':>10} {'bytes':>10} {'ok':>4}"]
+    for r in report["results"]:
+        mmacs = r["macs_per_s"] / 1e6 if r["macs_per_s"] else 0.0
+        ok = "" if r["verified"] is None else ("yes" if r["verified"] else "NO")
+        lines.append(f"{r['backend']:<9} {r['k']:>4} {r['n']:>4} {r['rows']:>6} {r['stall']:<7} "
+                     f"{r['latency_s'] * 1e6:>12.1f} {mmacs:>10.1f} {r['bytes_moved'] or 0:>10} {ok:>4}")
+    for s in report.get("skipped", []):
+        lines.append(f"skipped K={s['k']} N={s['n']} rows={s['rows']}: {s['reason']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="run the benchmark sweep")
+    run.add_argument("--out", help="write results JSON to this path")
+    run.add_argument("--shapes", default=",".join(f"{k}x{n}" for k, n in DEFAULT_SHAPES),
+                     help="comma separated KxN list (default: %(default)s)")
+    run.add_argument("--rows", default=",".join(map(str, DEFAULT_ROWS)),
+                     help="comma separated batch rows (default: %(default)s)")
+    run.add_argument("--repeats", type=int, default=5)
+    run.add_argument("--seed", type=int, default=2026)
+    run.add_argument("--backends", default=",".join(DEFAULT_BACKENDS),
+                     help="comma separated; add 'hardware' to run on the board (default: %(default)s)")
+
+    cmp_ = sub.add_parser("compare", help="flag slowdowns against a baseline")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("current")
+    cmp_.add_argument("--threshold", type=float, default=0.10,
+                      help="allowed fractional slowdown (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "run":
+        shapes = [tuple(int(v) for v in s.split("x")) for s in args.shapes.split(",")]
+        rows = [int(v) for v in args.rows.split(",")]
+        driver.stages.reset()
+        report = run_suite(shapes, rows, repeats=args.repeats, seed=args.seed,
+                           backends=tuple(args.backends.split(",")))
+        print(format_table(report))
+        print(driver.stages.report())
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+        return 0 if all(r["verified"] is not False for r in report["results"]) else 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r['backend']} K={r['k']} N={r['n']} rows={r['rows']} stall={r['stall']}: "
+              f"{r['baseline_latency_s'] * 1e6:.1f}us -> {r['latency_s'] * 1e6:.1f}us ({r['slowdown']:.2f}x)")
+    if not regressions:
+        print(f"No slowdowns beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
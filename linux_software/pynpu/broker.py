@@ -0,0 +1,739 @@
+"""
+Multi-process NPU broker.
+
+npu_test/main.c and the pynpu drivers assume they own the npu_ctrl registers
+and the DDR window exclusively. The broker is the single process that opens
+the device; other processes submit int8 matmul jobs (y = x @ w) to it.
+
+Each client creates a POSIX shared-memory arena:
+
+    0x000  header  uint32[16]: magic, version, slots, SQ head/tail, CQ head/tail
+    0x040  SQ      `slots` submission entries (job, rows, k, n, x/w/y offsets)
+    ...    CQ      `slots` completion entries (job, status)
+    page   data    tensors, allocated with BrokerClient.alloc()
+
+x, w and y stay in the arena: the broker reads x and w and writes y in place,
+nothing is copied through the socket. Each side notifies the other with an
+eventfd (submit: client -> broker, complete: broker -> client); both are passed
+to the broker with SCM_RIGHTS when the client connects to the Unix socket.
+Afterwards the socket only signals a client going away.
+
+Scheduling is deficit round robin over clients. Job cost is measured in
+tile-rows (rows * K tiles * N tiles, i.e. NPU streaming time) and each client
+gets `quantum * share` per round; the share a client asks for is capped at the
+broker's `max_share`. Jobs picked in the same round that use
+identical weights are concatenated into one NPU run, so a weight matrix shared
+by several clients is loaded once.
+
+Jobs are checked when they are fetched from the SQ: an empty shape or tensors
+outside the arena complete at once with -EINVAL, a job that cannot fit the DDR
+window with -E2BIG, so a bad job never blocks its client's queue. A device
+error fails only the jobs of that NPU run (-ETIMEDOUT / -EIO) and the weights
+are staged again for the next one.
+
+    python -m pynpu.broker --socket /run/npu-broker.sock              # on the board
+    python -m pynpu.broker --socket /tmp/npu-broker.sock --emulator   # anywhere
+"""
+import argparse
+import errno
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+import select
+import selectors
+import signal
+import socket
+import stat
+import struct
+import sys
+import time
+from collections import OrderedDict, deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import hw, ops
+from .compiler import Linear, compile_graph, linear_window_bytes
+from .device import DevMemDevice, Emulator
+
+DEFAULT_SOCKET = "/tmp/npu-broker.sock"
+ARENA_MAGIC = 0x4E505542  # "NPUB"
+ARENA_VERSION = 1
+DEFAULT_SLOTS = 64
+DEFAULT_DATA_BYTES = 16 << 20
+DEFAULT_QUANTUM = 4096     # tile-rows per round for a client with share 1
+DEFAULT_MAX_SHARE = 4.0    # largest share a client may ask for
+MAX_BATCH_ROWS = 4096      # rows concatenated into one NPU run
+PLAN_CACHE = 16
+ROW_BUCKET = 64            # plans are compiled per 64-row bucket
+TENSOR_ALIGN = 64
+HELLO_TIMEOUT = 1.0        # seconds a new connection has to send its handshake
+U32_MASK = 0xFFFFFFFF
+
+# Header word indices
+H_MAGIC, H_VERSION, H_SLOTS, H_SQ_HEAD, H_SQ_TAIL, H_CQ_HEAD, H_CQ_TAIL = range(7)
+HEADER_WORDS = 16
+
+SQE_DTYPE = np.dtype([("job", "<u4"), ("rows", "<u4"), ("k", "<u4"), ("n", "<u4"),
+                      ("x_off", "<u8"), ("w_off", "<u8"), ("y_off", "<u8")])
+CQE_DTYPE = np.dtype([("job", "<u4"), ("status", "<i4")])
+
+STATUS_OK = 0
+
+
+def _align(value, align):
+    return (value + align - 1) & ~(align - 1)
+
+
+# ============================================================================
+# Shared-memory arena
+# ============================================================================
+class Arena:
+    """Header, submission/completion rings and data area over one shared buffer."""
+
+    def __init__(self, buf, slots):
+        self.buf = buf
+        self.slots = slots
+        sq_off = HEADER_WORDS * 4
+        cq_off = sq_off + slots * SQE_DTYPE.itemsize
+        self.header = np.frombuffer(buf, dtype="<u4", count=HEADER_WORDS)
+        self.sq = np.frombuffer(buf, dtype=SQE_DTYPE, count=slots, offset=sq_off)
+        self.cq = np.frombuffer(buf, dtype=CQE_DTYPE, count=slots, offset=cq_off)
+        self.data_offset = _align(cq_off + slots * CQE_DTYPE.itemsize, mmap.PAGESIZE)
+        self.size = len(buf)
+
+    @staticmethod
+    def required_size(slots, data_bytes):
+        rings = HEADER_WORDS * 4 + slots * (SQE_DTYPE.itemsize + CQE_DTYPE.itemsize)
+        return _align(rings, mmap.PAGESIZE) + data_bytes
+
+    def init_header(self):
+        self.header[:] = 0
+        self.header[H_MAGIC] = ARENA_MAGIC
+        self.header[H_VERSION] = ARENA_VERSION
+        self.header[H_SLOTS] = self.slots
+
+    def check_header(self):
+        if int(self.header[H_MAGIC]) != ARENA_MAGIC:
+            raise ValueError("not an NPU broker arena")
+        if int(self.header[H_VERSION]) != ARENA_VERSION:
+            raise ValueError(f"arena version {int(self.header[H_VERSION])}, broker expects {ARENA_VERSION}")
+        if int(self.header[H_SLOTS]) != self.slots:
+            raise ValueError("arena slot count does not match the handshake")
+
+    def tensor(self, offset, shape, dtype):
+        """View of a tensor in the data area; ValueError if it does not fit."""
+        dtype = np.dtype(dtype)
+        count = math.prod(shape)  # exact: a garbage shape must not wrap around
+        if offset < self.data_offset or offset + count * dtype.itemsize > self.size:
+            raise ValueError(f"tensor at 0x{offset:x} ({count} x {dtype}) outside the arena data area")
+        return np.frombuffer(self.buf, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def release(self):
+        # Drop the views so the underlying buffer can be closed
+        self.header = self.sq = self.cq = None
+        self.buf = None
+
+
+def _ring_used(head, tail):
+    return (head - tail) & U32_MASK
+
+
+# ============================================================================
+# Client
+# ============================================================================
+class BrokerClient:
+    """Submit matmul jobs to a running broker through a shared-memory arena."""
+
+    def __init__(self, path=DEFAULT_SOCKET, slots=DEFAULT_SLOTS, data_bytes=DEFAULT_DATA_BYTES,
+                 share=1, timeout=5.0):
+        self._shm = shared_memory.SharedMemory(create=True, size=Arena.required_size(slots, data_bytes))
+        self.arena = Arena(self._shm.buf, slots)
+        self.arena.init_header()
+        self._base = np.frombuffer(self._shm.buf, dtype=np.uint8).ctypes.data
+        self._cursor = self.arena.data_offset
+        self._next_job = 0
+        self._results = {}   # job -> y view
+        self._done = {}      # job -> status
+        self._submit_efd = os.eventfd(0, os.EFD_CLOEXEC)
+        self._complete_efd = os.eventfd(0, os.EFD_CLOEXEC)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.settimeout(timeout)
+            self._sock.connect(path)
+            hello = json.dumps({"shm": self._shm.name, "slots": slots, "share": share}).encode()
+            socket.send_fds(self._sock, [hello + b"\n"], [self._submit_efd, self._complete_efd])
+            with self._sock.makefile("rb") as f:
+                reply = json.loads(f.readline() or b"{}")
+            if "client" not in reply:
+                raise ConnectionError(f"Broker refused client: {reply.get('error', 'no reply')}")
+            self.client_id = reply["client"]
+            self._sock.settimeout(None)
+        except BaseException:
+            self.close()
+            raise
+
+    # ------------------------------------------------------------------
+    # Tensor placement
+    # ------------------------------------------------------------------
+    def alloc(self, shape, dtype=np.int8):
+        """Allocate a tensor in the arena. Freed all at once by reset()."""
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        offset = _align(self._cursor, TENSOR_ALIGN)
+        if offset + nbytes > self.arena.size:
+            raise MemoryError(f"Broker arena full ({self.arena.size} bytes); call reset()")
+        self._cursor = offset + nbytes
+        return self.arena.tensor(offset, shape, dtype)
+
+    def reset(self):
+        """Free every tensor allocated so far (no job may be in flight)."""
+        if self._results:
+            raise RuntimeError(f"{len(self._results)} jobs still in flight")
+        self._cursor = self.arena.data_offset
+
+    def _place(self, a, dtype):
+        """Arena offset of `a`, copying it into the arena only if it lives elsewhere."""
+        a = np.asarray(a, dtype=dtype)
+        offset = a.ctypes.data - self._base
+        if a.flags.c_contiguous and self.arena.data_offset <= offset and offset + a.nbytes <= self.arena.size:
+            return offset
+        dst = self.alloc(a.shape, dtype)
+        dst[...] = a
+        return dst.ctypes.data - self._base
+
+    # ------------------------------------------------------------------
+    # Rings
+    # ------------------------------------------------------------------
+    def submit(self, x, w):
+        """Queue y = x @ w (int8 (rows, K) x (K, N)); returns a job id for wait()."""
+        x_off = self._place(x, np.int8)
+        w_off = self._place(w, np.int8)
+        rows, k = np.shape(x)
+        k_w, n = np.shape(w)
+        if k != k_w:
+            raise ValueError(f"Shape mismatch: x has K={k}, w has K={k_w}")
+        y = self.alloc((rows, n), np.int32)
+
+        h = self.arena.header
+        while _ring_used(int(h[H_SQ_HEAD]), int(h[H_SQ_TAIL])) >= self.arena.slots:
+            self._wait_for_completion(None)
+
+        job = self._next_job
+        self._next_job = (job + 1) & U32_MASK
+        head = int(h[H_SQ_HEAD])
+        self.arena.sq[head % self.arena.slots] = (job, rows, k, n, x_off, w_off,
+                                                  y.ctypes.data - self._base)
+        h[H_SQ_HEAD] = (head + 1) & U32_MASK
+        self._results[job] = y
+        os.eventfd_write(self._submit_efd, 1)
+        return job
+
+    def poll(self):
+        """Collect posted completions; returns how many were reaped."""
+        h = self.arena.header
+        tail = int(h[H_CQ_TAIL])
+        head = int(h[H_CQ_HEAD])
+        reaped = 0
+        while tail != head:
+            entry = self.arena.cq[tail % self.arena.slots]
+            self._done[int(entry["job"])] = int(entry["status"])
+            tail = (tail + 1) & U32_MASK
+            reaped += 1
+        h[H_CQ_TAIL] = tail
+        if reaped and h[H_SQ_HEAD] != h[H_SQ_TAIL]:
+            # The broker stops fetching while our CQ is full; tell it there is room
+            os.eventfd_write(self._submit_efd, 1)
+        return reaped
+
+    def done(self, job):
+        self.poll()
+        return job in self._done
+
+    def _wait_for_completion(self, timeout):
+        if self.poll():
+            return
+        ready, _, _ = select.select([self._complete_efd, self._sock], [], [], timeout)
+        if not ready:
+            raise TimeoutError("Timed out waiting for the NPU broker")
+        if self._sock in ready:
+            raise ConnectionError("NPU broker closed the connection")
+        os.eventfd_read(self._complete_efd)
+        self.poll()
+
+    def wait(self, job, timeout=None):
+        """Block until `job` completes; returns its int32 (rows, N) result view in the arena."""
+        while not self.done(job):
+            self._wait_for_completion(timeout)
+        status = self._done.pop(job)
+        if status != STATUS_OK:
+            # Drop the result view first: the traceback would otherwise pin the arena
+            del self._results[job]
+            raise OSError(-status, f"NPU job {job} failed: {os.strerror(-status)}")
+        return self._results.pop(job)
+
+    def matmul(self, x, w, timeout=None):
+        return self.wait(self.submit(x, w), timeout)
+
+    def close(self):
+        """Disconnect and free the arena (drop result views first)."""
+        self._sock.close()
+        for fd in (self._submit_efd, self._complete_efd):
+            os.close(fd)
+        self._results.clear()
+        self.arena.release()
+        self._shm.close()
+        self._shm.unlink()
+
+
+# ============================================================================
+# Broker
+# ============================================================================
+class _Job:
+    __slots__ = ("client", "job", "rows", "k", "n", "x_off", "w_off", "y_off")
+
+    def __init__(self, client, entry):
+        self.client = client
+        self.job = int(entry["job"])
+        self.rows = int(entry["rows"])
+        self.k = int(entry["k"])
+        self.n = int(entry["n"])
+        self.x_off = int(entry["x_off"])
+        self.w_off = int(entry["w_off"])
+        self.y_off = int(entry["y_off"])
+
+    @property
+    def cost(self):
+        return self.rows * ops.num_tiles(self.k) * ops.num_tiles(self.n)
+
+
+class _ClientState:
+    def __init__(self, cid, conn, mm, arena, submit_efd, complete_efd, share):
+        self.id = cid
+        self.conn = conn
+        self.mm = mm
+        self.arena = arena
+        self.submit_efd = submit_efd
+        self.complete_efd = complete_efd
+        self.share = share
+        self.queue = deque()
+        self.deficit = 0
+        self.stats = {"jobs": 0, "rows": 0, "errors": 0}
+
+    def close(self):
+        self.conn.close()
+        os.close(self.submit_efd)
+        os.close(self.complete_efd)
+        self.arena.release()
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # a view is still referenced (e.g. by a traceback); unmapped when collected
+
+
+def _peer_uid(conn):
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)  # pid, uid, gid
+    return uid
+
+
+def _check_eventfd(fd):
+    """Make sure an fd from SCM_RIGHTS is an eventfd and switch it to non-blocking."""
+    if os.readlink(f"/proc/self/fd/{fd}") != "anon_inode:[eventfd]":
+        raise ValueError("notification fds must be eventfds")
+    # A full counter must make the broker's write fail, not block every client
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+
+def _attach_shm(name, uid=None):
+    """
+    Map the client's POSIX shared-memory segment. Only a plain name inside
+    /dev/shm is accepted (no paths, no symlinks) and, if `uid` is given, the
+    segment must belong to that user.
+    """
+    # Map the segment directly: attaching through SharedMemory would register it
+    # with this process's resource tracker, which unlinks it when the broker exits.
+    if not isinstance(name, str):
+        raise ValueError("shm name must be a string")
+    name = name[1:] if name.startswith("/") else name
+    if not name or "/" in name or ".." in name or "\0" in name:
+        raise ValueError(f"invalid shm name {name!r}")
+    dir_fd = os.open("/dev/shm", os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+    try:
+        fd = os.open(name, os.O_RDWR | os.O_NOFOLLOW | os.O_NONBLOCK | os.O_CLOEXEC, dir_fd=dir_fd)
+    finally:
+        os.close(dir_fd)
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            raise ValueError(f"shm {name!r} is not a regular file")
+        if uid not in (None, 0) and st.st_uid != uid:
+            raise ValueError(f"shm {name!r} is not owned by the client")
+        return mmap.mmap(fd, 0)
+    finally:
+        os.close(fd)
+
+
+class Broker:
+    """Owns `dev` and serves matmul jobs from BrokerClients connected to `path`."""
+
+    def __init__(self, dev, path=DEFAULT_SOCKET, quantum=DEFAULT_QUANTUM, max_batch_rows=MAX_BATCH_ROWS,
+                 max_share=DEFAULT_MAX_SHARE):
+        self.dev = dev
+        self.path = path
+        self.quantum = quantum
+        self.max_share = max_share
+        self.max_batch_rows = max_batch_rows
+        self.clients = OrderedDict()  # round-robin order
+        self.stats = {"rounds": 0, "batches": 0, "jobs": 0, "device_errors": 0}
+        self._pending = {}  # connections waiting for their handshake -> deadline
+        self._plans = OrderedDict()
+        self._staged = None
+        self._next_id = 1
+        self._running = False
+
+        # One broker per device: the lock outlives a crashed broker's stale socket
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._lock_fd)
+            raise RuntimeError(f"Another broker already owns the NPU ({path}.lock)") from None
+        if os.path.exists(path):
+            os.unlink(path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(path)
+        self._listener.listen()
+        self._listener.setblocking(False)
+        self._wake = os.eventfd(0, os.EFD_CLOEXEC | os.EFD_NONBLOCK)
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self._listener, selectors.EVENT_READ, ("accept", None))
+        self._sel.register(self._wake, selectors.EVENT_READ, ("wake", None))
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+    def _accept(self):
+        """Accept a connection; its handshake is read by _hello() once it arrives."""
+        conn, _ = self._listener.accept()
+        conn.setblocking(False)
+        self._pending[conn] = time.monotonic() + HELLO_TIMEOUT
+        self._sel.register(conn, selectors.EVENT_READ, ("hello", conn))
+
+    def _expire_pending(self):
+        now = time.monotonic()
+        for conn, deadline in list(self._pending.items()):
+            if deadline <= now:
+                self._reject(conn, "handshake timed out")
+
+    def _reject(self, conn, error):
+        del self._pending[conn]
+        self._sel.unregister(conn)
+        try:
+            conn.send(json.dumps({"error": error}).encode() + b"\n")
+        except OSError:
+            pass
+        conn.close()
+
+    def _hello(self, conn):
+        fds = []
+        mm = None
+        arena = None
+        try:
+            msg, fds, _, _ = socket.recv_fds(conn, 4096, 2)
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            self._reject(conn, str(e))
+            return None
+        try:
+            if not msg.endswith(b"\n"):
+                raise ValueError("incomplete handshake")
+            hello = json.loads(msg)
+            if len(fds) != 2:
+                raise ValueError("expected submit and completion eventfds")
+            for fd in fds:
+                _check_eventfd(fd)
+            share = float(hello.get("share", 1))
+            if not share > 0:
+                raise ValueError("share must be positive")
+            share = min(share, self.max_share)  # also turns inf into the cap
+            mm = _attach_shm(hello["shm"], _peer_uid(conn))
+            arena = Arena(mm, int(hello["slots"]))
+            arena.check_header()
+            # Only a client that received its id is served
+            conn.send(json.dumps({"client": self._next_id}).encode() + b"\n")
+        except (ValueError, KeyError, TypeError, AttributeError, OSError) as e:
+            for fd in fds:
+                os.close(fd)
+            if arena is not None:
+                arena.release()
+            if mm is not None:
+                mm.close()
+            self._reject(conn, str(e))
+            return None
+
+        del self._pending[conn]
+        client = _ClientState(self._next_id, conn, mm, arena, fds[0], fds[1], share)
+        self._next_id += 1
+        self.clients[client.id] = client
+        self._sel.modify(conn, selectors.EVENT_READ, ("hangup", client))
+        self._sel.register(client.submit_efd, selectors.EVENT_READ, ("submit", client))
+        return client
+
+    def _drop(self, client):
+        self._sel.unregister(client.conn)
+        self._sel.unregister(client.submit_efd)
+        del self.clients[client.id]
+        client.close()
+
+    def _fetch(self, client, notify):
+        """
+        Move new submissions into the client's queue, keeping the CQ from
+        overflowing. Invalid jobs are completed here and never queued.
+        """
+        h = client.arena.header
+        head = int(h[H_SQ_HEAD])
+        tail = int(h[H_SQ_TAIL])
+        while tail != head and _ring_used(tail, int(h[H_CQ_TAIL])) < client.arena.slots:
+            job = _Job(client, client.arena.sq[tail % client.arena.slots])
+            tail = (tail + 1) & U32_MASK
+            status = self._check(job)
+            if status == STATUS_OK:
+                client.queue.append(job)
+            else:
+                self._complete(job, status, notify)
+        h[H_SQ_TAIL] = tail
+
+    def _check(self, job):
+        """STATUS_OK, -EINVAL for a malformed job or -E2BIG if it cannot fit the DDR window."""
+        if job.rows == 0 or job.k == 0 or job.n == 0:
+            return -errno.EINVAL
+        arena = job.client.arena
+        try:
+            arena.tensor(job.x_off, (job.rows, job.k), np.int8)
+            arena.tensor(job.w_off, (job.k, job.n), np.int8)
+            arena.tensor(job.y_off, (job.rows, job.n), np.int32)
+        except ValueError:
+            return -errno.EINVAL
+        if self._window_bytes(job.k, job.n, job.rows) > hw.HPS_FPGA_RAM_SPAN:
+            return -errno.E2BIG
+        return STATUS_OK
+
+    @staticmethod
+    def _window_bytes(k, n, rows):
+        # Plans are compiled per row bucket, so that is what has to fit
+        return linear_window_bytes(k, n, _align(rows, ROW_BUCKET))
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def schedule(self):
+        """One deficit round robin round: the jobs each client may dispatch now."""
+        picked = []
+        for client in self.clients.values():
+            if not client.queue:
+                client.deficit = 0
+                continue
+            client.deficit += self.quantum * client.share
+            while client.queue and client.queue[0].cost <= client.deficit:
+                job = client.queue.popleft()
+                client.deficit -= job.cost
+                picked.append(job)
+            if not client.queue:
+                client.deficit = 0
+        if self.clients:
+            # Rotate so no client is always first into a round's batches
+            self.clients.move_to_end(next(iter(self.clients)))
+        return picked
+
+    def _plan(self, wkey, w, rows):
+        bucket = _align(rows, ROW_BUCKET)
+        key = (wkey, bucket)
+        plan = self._plans.pop(key, None)
+        if plan is None:
+            plan = compile_graph([Linear(w)], input_shape=(w.shape[0],), batch=bucket)
+            if len(self._plans) >= PLAN_CACHE:
+                self._plans.popitem(last=False)
+        self._plans[key] = plan
+        return plan
+
+    def _complete(self, job, status, notify):
+        client = job.client
+        h = client.arena.header
+        head = int(h[H_CQ_HEAD])
+        client.arena.cq[head % client.arena.slots] = (job.job, status)
+        h[H_CQ_HEAD] = (head + 1) & U32_MASK
+        client.stats["jobs"] += 1
+        client.stats["rows"] += job.rows
+        if status != STATUS_OK:
+            client.stats["errors"] += 1
+        self.stats["jobs"] += 1
+        notify.add(client)
+
+    def _execute(self, wkey, w, batch, notify):
+        rows = sum(job.rows for job in batch)
+        try:
+            plan = self._plan(wkey, w, rows)
+        except ValueError:
+            for job in batch:
+                self._complete(job, -errno.E2BIG, notify)
+            return
+        x = np.concatenate([job.client.arena.tensor(job.x_off, (job.rows, job.k), np.int8)
+                            for job in batch])
+        try:
+            if self._staged != wkey:
+                plan.stage(self.dev)
+                self._staged = wkey
+            y = plan.run(self.dev, x)
+        except Exception as e:
+            # Fail this run only; the device state is unknown, so stage again next time
+            self._staged = None
+            self.stats["device_errors"] += 1
+            status = -errno.ETIMEDOUT if isinstance(e, TimeoutError) else -errno.EIO
+            for job in batch:
+                self._complete(job, status, notify)
+            return
+        self.stats["batches"] += 1
+        start = 0
+        for job in batch:
+            job.client.arena.tensor(job.y_off, (job.rows, job.n), np.int32)[...] = y[start:start + job.rows]
+            start += job.rows
+            self._complete(job, STATUS_OK, notify)
+
+    def run_round(self, notify=None):
+        """Schedule and execute one round; returns the number of jobs completed."""
+        notify = set() if notify is None else notify
+        picked = self.schedule()
+        if picked:
+            self.stats["rounds"] += 1
+        groups = OrderedDict()  # weight digest -> (w, jobs)
+        for job in picked:
+            # Checked in _fetch(), so the views are in bounds
+            w = job.client.arena.tensor(job.w_off, (job.k, job.n), np.int8)
+            wkey = (job.k, job.n, hashlib.blake2b(w, digest_size=16).digest())
+            groups.setdefault(wkey, (w, []))[1].append(job)
+
+        for wkey, (w, jobs) in groups.items():
+            k, n = wkey[0], wkey[1]
+            batch = []
+            rows = 0
+            for job in jobs:
+                if batch and (rows + job.rows > self.max_batch_rows
+                              or self._window_bytes(k, n, rows + job.rows) > hw.HPS_FPGA_RAM_SPAN):
+                    self._execute(wkey, w, batch, notify)
+                    batch = []
+                    rows = 0
+                batch.append(job)
+                rows += job.rows
+            self._execute(wkey, w, batch, notify)
+
+        for client in notify:
+            self._notify(client)
+        return len(picked)
+
+    def _notify(self, client):
+        try:
+            os.eventfd_write(client.complete_efd, 1)
+        except OSError:
+            # Counter saturated by the client, or the fd went bad: drop only this client
+            if client.id in self.clients:
+                self._drop(client)
+
+    # ------------------------------------------------------------------
+    # Event loop
+    # ------------------------------------------------------------------
+    def poll(self, timeout=None):
+        """
+        Handle connections and submissions, then run one scheduling round.
+        Returns the number of jobs completed, including ones rejected at fetch.
+        """
+        completed = self.stats["jobs"]
+        if self._pending:
+            # Wake up in time to drop a connection that never sends its handshake
+            wait = max(0.0, min(self._pending.values()) - time.monotonic())
+            timeout = wait if timeout is None else min(timeout, wait)
+        for key, _ in self._sel.select(timeout):
+            kind, client = key.data
+            if kind == "accept":
+                self._accept()
+            elif kind == "hello":
+                if client in self._pending:
+                    self._hello(client)
+            elif kind == "wake":
+                os.eventfd_read(self._wake)
+            elif kind == "submit" and client.id in self.clients:
+                try:
+                    os.eventfd_read(client.submit_efd)
+                except BlockingIOError:
+                    pass  # the client drained its own counter; fetch anyway
+            elif kind == "hangup" and client.id in self.clients:
+                try:
+                    if client.conn.recv(64):
+                        continue  # clients never send after the handshake
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    pass
+                self._drop(client)
+        self._expire_pending()
+        notify = set()
+        for client in self.clients.values():
+            self._fetch(client, notify)
+        self.run_round(notify)
+        return self.stats["jobs"] - completed
+
+    def serve_forever(self):
+        self._running = True
+        while self._running:
+            pending = any(client.queue for client in self.clients.values())
+            self.poll(0 if pending else None)
+
+    def shutdown(self):
+        """Stop serve_forever() (safe from signal handlers and other threads)."""
+        self._running = False
+        os.eventfd_write(self._wake, 1)
+
+    def close(self):
+        for conn in list(self._pending):
+            self._reject(conn, "broker shutting down")
+        for client in list(self.clients.values()):
+            self._drop(client)
+        self._sel.close()
+        self._listener.close()
+        os.close(self._wake)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.close(self._lock_fd)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--emulator", action="store_true", help="serve from the in-process Emulator")
+    parser.add_argument("--quantum", type=int, default=DEFAULT_QUANTUM,
+                        help="tile-rows per client per round (default: %(default)s)")
+    parser.add_argument("--max-batch-rows", type=int, default=MAX_BATCH_ROWS)
+    parser.add_argument("--max-share", type=float, default=DEFAULT_MAX_SHARE,
+                        help="cap on the fairness share a client may ask for (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    dev = Emulator() if args.emulator else DevMemDevice()
+    broker = Broker(dev, args.socket, quantum=args.quantum, max_batch_rows=args.max_batch_rows,
+                    max_share=args.max_share)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: broker.shutdown())
+    print(f"NPU broker listening on {args.socket} ({'emulator' if args.emulator else 'hardware'})")
+    try:
+        broker.serve_forever()
+    finally:
+        broker.close()
+        dev.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
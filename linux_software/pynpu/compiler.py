@@ -0,0 +1,189 @@
+"""
+Ahead-of-time lowering of small int8 Linear/Conv2d graphs to an ExecutionPlan.
+
+Each layer becomes a matmul X(rows, K) @ W(K, N) split into 8x8 weight tiles.
+The compiler decides everything that does not depend on activation values:
+  - preformatted weight tile images (column-shift stream order)
+  - DDR window placement of weights, per-layer input and output regions
+  - the ordered npu_ctrl register writes and MSGDMA descriptors per tile
+
+Partial sums over K tiles, bias, requantization and conv im2col stay on the
+host (y_in of the systolic core is tied to zero).
+"""
+import numpy as np
+
+from . import hw, ops
+from .plan import (ExecutionPlan, OP_DMA_READ, OP_DMA_WRITE, OP_REG_WRITE,
+                   OP_WAIT_EXEC, OP_WAIT_READ)
+
+WINDOW_ALIGN = 0x1000
+
+
+class Linear:
+    """y = x @ weight + bias, weight shaped (in_features, out_features) int8."""
+
+    def __init__(self, weight, bias=None, shift=None, relu=False):
+        self.weight = np.asarray(weight, dtype=np.int8)
+        if self.weight.ndim != 2:
+            raise ValueError("Linear weight must be (in_features, out_features)")
+        self.bias = None if bias is None else np.asarray(bias, dtype=np.int32)
+        self.shift = shift
+        self.relu = relu
+
+
+class Conv2d:
+    """NCHW convolution lowered through im2col, weight shaped (out_ch, in_ch, kh, kw) int8."""
+
+    def __init__(self, weight, bias=None, stride=1, padding=0, shift=None, relu=False):
+        self.weight = np.asarray(weight, dtype=np.int8)
+        if self.weight.ndim != 4:
+            raise ValueError("Conv2d weight must be (out_ch, in_ch, kh, kw)")
+        self.bias = None if bias is None else np.asarray(bias, dtype=np.int32)
+        self.stride = stride
+        self.padding = padding
+        self.shift = shift
+        self.relu = relu
+
+
+def _align(value, align=WINDOW_ALIGN):
+    return (value + align - 1) // align * align
+
+
+def _row_chunks(rows):
+    start = 0
+    while start < rows:
+        count = min(hw.MAX_ROWS_PER_TRANSFER, rows - start)
+        yield start, count
+        start += count
+
+
+def linear_window_bytes(k, n, rows):
+    """DDR window compile_graph() lays out for a single (K, N) Linear over `rows` rows."""
+    kt, nt = ops.num_tiles(k), ops.num_tiles(n)
+    in_offset = _align(kt * nt * hw.NPU_MAT_BYTES)
+    out_offset = _align(in_offset + kt * rows * hw.NPU_ROW_BYTES)
+    return _align(out_offset + kt * nt * rows * hw.NPU_OUT_ROW_BYTES)
+
+
+def _lower(layer, in_shape, batch):
+    """Return (meta, weight matrix (K, N), out_shape) for one layer."""
+    if isinstance(layer, Conv2d):
+        if len(in_shape) != 3:
+            raise ValueError(f"Conv2d expects a (C, H, W) input, got {in_shape}")
+        cout, cin, kh, kw = layer.weight.shape
+        if cin != in_shape[0]:
+            raise ValueError(f"Conv2d expects {cin} input channels, got {in_shape[0]}")
+        if layer.stride <= 0:
+            raise ValueError(f"Conv2d stride must be positive, got {layer.stride}")
+        if layer.padding < 0:
+            raise ValueError(f"Conv2d padding must be non-negative, got {layer.padding}")
+        ho, wo = ops.conv_output_hw(in_shape[1], in_shape[2], kh, kw, layer.stride, layer.padding)
+        if ho <= 0 or wo <= 0:
+            raise ValueError(f"Conv2d {kh}x{kw} kernel does not fit the padded "
+                             f"{in_shape[1]}x{in_shape[2]} input")
+        meta = {"kind": "conv2d", "kernel": [kh, kw], "stride": layer.stride,
+                "padding": layer.padding, "rows": batch * ho * wo}
+        return meta, layer.weight.reshape(cout, cin * kh * kw).T, (cout, ho, wo)
+    if isinstance(layer, Linear):
+        k = int(np.prod(in_shape))
+        if layer.weight.shape[0] != k:
+            raise ValueError(f"Linear expects {layer.weight.shape[0]} inputs, got {k}")
+        meta = {"kind": "linear", "rows": batch}
+        return meta, layer.weight, (layer.weight.shape[1],)
+    raise TypeError(f"Unsupported layer type: {type(layer).__name__}")
+
+
+def compile_graph(layers, input_shape, batch):
+    """Lower a sequential graph of Linear/Conv2d layers for a fixed batch size."""
+    if batch <= 0:
+        raise ValueError("batch must be positive")
+    for layer in layers[:-1]:
+        if layer.shift is None:
+            raise ValueError("Intermediate layers need a requantization shift")
+
+    weight_images = []
+    biases = []
+    program = []
+    layer_metas = []
+    lowered = []
+
+    shape = tuple(input_shape)
+    for layer in layers:
+        meta, w, out_shape = _lower(layer, shape, batch)
+        meta["in_shape"] = list(shape)
+        meta["out_shape"] = list(out_shape)
+        lowered.append((meta, w))
+        shape = out_shape
+
+    # Weight tiles first: one contiguous image staged with a single copy at load
+    weight_size = sum(ops.num_tiles(w.shape[0]) * ops.num_tiles(w.shape[1])
+                      for _, w in lowered) * hw.NPU_MAT_BYTES
+    cursor = _align(weight_size)
+
+    for meta, w in lowered:
+        k, n = w.shape
+        kt, nt = ops.num_tiles(k), ops.num_tiles(n)
+        rows = meta["rows"]
+        w_pad = np.zeros((kt * hw.NPU_MAT_SIZE, nt * hw.NPU_MAT_SIZE), dtype=np.int8)
+        w_pad[:k, :n] = w
+
+        tile_base = len(weight_images) * hw.NPU_MAT_BYTES
+        for j in range(nt):
+            for i in range(kt):
+                tile = w_pad[i * 8:(i + 1) * 8, j * 8:(j + 1) * 8]
+                weight_images.append(hw.format_weights(tile))
+
+        in_offset = cursor
+        out_offset = _align(in_offset + kt * rows * hw.NPU_ROW_BYTES)
+        cursor = _align(out_offset + kt * nt * rows * hw.NPU_OUT_ROW_BYTES)
+
+        prog_start = len(program)
+        for j in range(nt):
+            for i in range(kt):
+                w_off = tile_base + (j * kt + i) * hw.NPU_MAT_BYTES
+                program += [
+                    (OP_REG_WRITE, hw.REG_CTRL, hw.CTRL_LOAD_WEIGHTS, 0),
+                    (OP_DMA_READ, w_off, hw.NPU_MAT_BYTES, 0),
+                    (OP_WAIT_READ, hw.NPU_MAT_SIZE, 0, 0),
+                    (OP_REG_WRITE, hw.REG_WEIGHT_LATCH, 1, 0),
+                    (OP_REG_WRITE, hw.REG_WEIGHT_LATCH, 0, 0),
+                ]
+                x_base = in_offset + i * rows * hw.NPU_ROW_BYTES
+                y_base = out_offset + (j * kt + i) * rows * hw.NPU_OUT_ROW_BYTES
+                for start, count in _row_chunks(rows):
+                    program += [
+                        (OP_REG_WRITE, hw.REG_SEQ_ROWS, count, 0),
+                        (OP_DMA_WRITE, y_base + start * hw.NPU_OUT_ROW_BYTES,
+                         count * hw.NPU_OUT_ROW_BYTES, 0),
+                        (OP_REG_WRITE, hw.REG_CTRL, hw.CTRL_EXECUTE, 0),
+                        (OP_DMA_READ, x_base + start * hw.NPU_ROW_BYTES,
+                         count * hw.NPU_ROW_BYTES, 0),
+                        (OP_WAIT_EXEC, count, 0, 0),
+                    ]
+
+        meta.update({"k": k, "n": n, "k_tiles": kt, "n_tiles": nt,
+                     "in_offset": in_offset, "out_offset": out_offset,
+                     "prog_start": prog_start, "prog_count": len(program) - prog_start})
+        layer_metas.append(meta)
+
+    if cursor > hw.HPS_FPGA_RAM_SPAN:
+        raise ValueError(f"Plan needs {cursor} bytes of DDR window, only "
+                         f"{hw.HPS_FPGA_RAM_SPAN} available; reduce the batch size")
+
+    for layer, meta in zip(layers, layer_metas):
+        n = meta["n"]
+        bias = np.zeros(n, dtype=np.int32) if layer.bias is None else layer.bias
+        if bias.shape != (n,):
+            raise ValueError(f"bias must have {n} entries, got {bias.shape}")
+        meta["bias_index"] = sum(len(b) for b in biases)
+        meta["shift"] = layer.shift
+        meta["relu"] = bool(layer.relu)
+        biases.append(bias)
+
+    return ExecutionPlan(
+        weights=b"".join(weight_images),
+        program=np.array(program, dtype=np.uint32).reshape(-1, 4),
+        biases=np.concatenate(biases).astype(np.int32),
+        meta={"batch": batch, "input_shape": list(input_shape),
+              "weight_offset": 0, "window_size": cursor, "layers": layer_metas},
+    )
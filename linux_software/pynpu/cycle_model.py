@@ -0,0 +1,156 @@
+"""
+Flit-level cycle model of npu_unit's Avalon-ST datapath.
+
+Models what matters for differential testing and throughput estimates:
+  - the sink accepts one 64-bit flit per cycle while valid and the skew
+    pipeline has room (st_sink_ready = systolic ready_out)
+  - each input row leaves the array PIPELINE_DEPTH cycles later as a 256-bit row
+  - rows enter the 8-deep output FIFO; a full FIFO stalls the array
+  - the serializer emits 4 flits per row while st_source_ready is high,
+    with SOP/EOP derived from seq_total_rows exactly like npu_stream_ctrl
+
+Data and SOP/EOP placement are exact. Cycle counts approximate the elastic
+pipeline; sim/test_fuzz.py holds them to CYCLE_TOLERANCE of the RTL. The data path does not use
+hw.golden_matmul: weight flits are shifted through the PE shadow registers
+(column 7 first, byte i into array row i) and each input row is accumulated
+down the PE columns with 16-bit products and a wrapping 32-bit partial sum,
+as mac_pe does, so the fuzzer compares two independent computations.
+"""
+from collections import deque
+
+import numpy as np
+
+from . import hw, ops
+
+# Input skew (N - 1 stages) + one PE per array row; measured against the RTL
+# by sim/test_fuzz.py, which also checks the cycle counts below
+PIPELINE_DEPTH = 2 * hw.NPU_MAT_SIZE - 1
+OUT_FIFO_DEPTH = 8
+FLITS_PER_ROW = 4
+NPU_CLK_HZ = 50000000
+WEIGHT_FLUSH_CYCLES = 30  # pipeline flush before the weight latch (see test_npu.py)
+
+
+def row_flits(y):
+    """Split int32 (rows, 8) results into the serializer's 64-bit flit order."""
+    y = np.ascontiguousarray(np.asarray(y, dtype="<i4"))
+    return y.view("<u8").reshape(-1)
+
+
+def _flit_lanes(image):
+    """Split an 8-byte-per-flit stream image into (flits, 8) int8 lanes (byte i -> array row i)."""
+    words = np.frombuffer(image, dtype="<u8")
+    shifts = np.arange(hw.NPU_MAT_SIZE, dtype=np.uint64) * np.uint64(8)
+    return ((words[:, None] >> shifts) & np.uint64(0xFF)).astype(np.uint8).view(np.int8)
+
+
+def shift_weights(weights):
+    """Shadow weight registers after the tile's flit stream is shifted through the PE rows."""
+    shadow = np.zeros((hw.NPU_MAT_SIZE, hw.NPU_MAT_SIZE), dtype=np.int8)
+    for lanes in _flit_lanes(hw.format_weights(weights)):
+        # Each PE takes x_in and passes its old shadow value to the right
+        shadow[:, 1:] = shadow[:, :-1].copy()
+        shadow[:, 0] = lanes
+    return shadow
+
+
+def systolic_matmul(inputs, active):
+    """Column partial sums of the PE array: y_out of each column for every input row."""
+    x = _flit_lanes(hw.format_inputs(inputs)).astype(np.int16)
+    w = np.asarray(active, dtype=np.int8).astype(np.int16)
+    y = np.zeros((len(x), hw.NPU_MAT_SIZE), dtype=np.int32)
+    for i in range(hw.NPU_MAT_SIZE):
+        # PE (i, j): y_in + sign-extended 16-bit x * w, wrapping at 32 bits
+        y += (x[:, i:i + 1] * w[i]).astype(np.int32)
+    return y
+
+
+def _pattern(schedule):
+    schedule = list(schedule) if schedule else [1]
+    assert any(schedule), "a schedule must be high at least once"
+    return schedule
+
+
+class CycleModel:
+    """Stateful model; tx_row_count carries across runs like the RTL register."""
+
+    def __init__(self):
+        self.active = np.zeros((hw.NPU_MAT_SIZE, hw.NPU_MAT_SIZE), dtype=np.int8)
+        self.tx_row_count = 0
+
+    def load_weights(self, weights, sink_valid=None):
+        """Stream one 8x8 weight tile and latch it. Returns the cycles spent."""
+        valid = _pattern(sink_valid)
+        cycle = accepted = 0
+        while accepted < hw.NPU_MAT_SIZE:
+            accepted += valid[cycle % len(valid)]
+            cycle += 1
+        self.active = shift_weights(weights)  # weight_latch_en: shadow -> active
+        return cycle
+
+    def run(self, inputs, seq_total_rows=None, sink_valid=None, source_ready=None):
+        """
+        Stream int8 (rows, 8) inputs in execute mode.
+
+        Returns (flits, cycles) where flits is a list of (data, sop, eop) tuples.
+        """
+        inputs = np.asarray(inputs, dtype=np.int8)
+        rows = len(inputs)
+        seq_rows = rows if seq_total_rows is None else seq_total_rows
+        valid = _pattern(sink_valid)
+        ready = _pattern(source_ready)
+        flit_data = row_flits(systolic_matmul(inputs, self.active)).reshape(rows, FLITS_PER_ROW)
+
+        pipe = deque()   # (release cycle, row index)
+        fifo = deque()   # row indices waiting for the serializer
+        tx_row = None
+        tx_count = 0
+        next_in = 0
+        flits = []
+        cycle = 0
+        while len(flits) < rows * FLITS_PER_ROW:
+            # Serializer (registered: a row popped while idle starts next cycle)
+            if tx_row is not None and ready[cycle % len(ready)]:
+                sop = tx_count == 0 and self.tx_row_count == 0
+                eop = seq_rows > 0 and tx_count == 3 and self.tx_row_count == seq_rows - 1
+                flits.append((int(flit_data[tx_row, tx_count]), sop, eop))
+                tx_count += 1
+                if tx_count == FLITS_PER_ROW:
+                    if eop:
+                        self.tx_row_count = 0
+                    else:
+                        self.tx_row_count += 1
+                    tx_row = fifo.popleft() if fifo else None
+                    tx_count = 0
+            elif tx_row is None and fifo:
+                tx_row = fifo.popleft()
+                tx_count = 0
+
+            # Array output -> FIFO, one row per cycle, blocked while the FIFO is full
+            if pipe and pipe[0][0] <= cycle and len(fifo) < OUT_FIFO_DEPTH:
+                fifo.append(pipe.popleft()[1])
+
+            # Sink handshake
+            if next_in < rows and valid[cycle % len(valid)] and len(pipe) < PIPELINE_DEPTH:
+                pipe.append((cycle + PIPELINE_DEPTH, next_in))
+                next_in += 1
+            cycle += 1
+        return flits, cycle
+
+
+def estimate_cycles(rows, source_ready=None):
+    """Steady-state cycles to stream `rows` rows (no input gaps)."""
+    if source_ready is None:
+        return PIPELINE_DEPTH + FLITS_PER_ROW * rows + 2  # + FIFO write + serializer load
+    model = CycleModel()
+    _, cycles = model.run(np.zeros((rows, hw.NPU_MAT_SIZE), dtype=np.int8),
+                          source_ready=source_ready)
+    return cycles
+
+
+def model_latency(k, n, rows, source_ready=None):
+    """Seconds for a (rows, K) x (K, N) matmul: per tile a weight load, flush and row stream."""
+    tiles = ops.num_tiles(k) * ops.num_tiles(n)
+    per_tile = (hw.NPU_MAT_SIZE + WEIGHT_FLUSH_CYCLES
+                + estimate_cycles(rows, source_ready))
+    return tiles * per_tile / NPU_CLK_HZ
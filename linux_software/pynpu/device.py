@@ -0,0 +1,202 @@
+"""
+NPU device backends.
+
+A device exposes the two regions main.c maps from /dev/mem:
+  - the LWH2F bridge (npu_ctrl + MSGDMA CSR/descriptor ports) via read32/write32
+  - the DDR window shared with the MSGDMA engines via `window` (a writable buffer)
+
+DevMemDevice drives the real board. Emulator is a functional, in-process stand-in
+that decodes the same register writes so host code can run without an FPGA.
+"""
+import mmap
+import os
+
+import numpy as np
+
+from . import hw
+
+
+class DevMemDevice:
+    """Memory-mapped access to the NPU through /dev/mem (requires root on the DE10-Nano)."""
+
+    def __init__(self, path="/dev/mem"):
+        self.phys_base = hw.HPS_FPGA_RAM_BASE
+        self._fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            self._lw = mmap.mmap(self._fd, hw.LWHPS2FPGA_SPAN, mmap.MAP_SHARED,
+                                 mmap.PROT_READ | mmap.PROT_WRITE, offset=hw.LWHPS2FPGA_BASE)
+            self._ddr = mmap.mmap(self._fd, hw.HPS_FPGA_RAM_SPAN, mmap.MAP_SHARED,
+                                  mmap.PROT_READ | mmap.PROT_WRITE, offset=hw.HPS_FPGA_RAM_BASE)
+        except OSError:
+            os.close(self._fd)
+            raise
+        # 32-bit views guarantee single-word bus accesses on the bridge
+        self._regs = memoryview(self._lw).cast("I")
+        self.window = memoryview(self._ddr)
+
+    def read32(self, offset):
+        return self._regs[offset >> 2]
+
+    def write32(self, offset, value):
+        self._regs[offset >> 2] = value & 0xFFFFFFFF
+
+    def close(self):
+        self._regs.release()
+        self.window.release()
+        self._lw.close()
+        self._ddr.close()
+        os.close(self._fd)
+
+
+class _MsgdmaPort:
+    """Standard-format descriptor slave: the GO write to CONTROL commits the descriptor."""
+
+    def __init__(self):
+        self.fields = [0, 0, 0, 0]  # READ_ADDRESS, WRITE_ADDRESS, LENGTH, CONTROL
+
+    def write(self, reg, value):
+        self.fields[reg] = value
+        if reg == 3 and (value & hw.MSGDMA_DESC_GO):
+            return tuple(self.fields)
+        return None
+
+
+class Emulator:
+    """
+    Functional model of npu_unit + the two MSGDMA engines.
+
+    Weight loads shift columns into the shadow registers, REG_WEIGHT_LATCH copies
+    them into the active registers, and every input flit in execute mode produces
+    one int32 output row. Outputs are queued until a write descriptor drains them,
+    using the same DDR byte layout the board produces. DMA completes instantly.
+    Input rows streamed while IBUF_CTRL.CAPTURE is set are kept (up to
+    `ibuf_depth`) and IBUF_CTRL.REPLAY runs them through the active weights again.
+    A replay reads busy until its rows have been written out; like the RTL it is
+    fixed at its start, so restarting capture meanwhile does not change it.
+    """
+
+    def __init__(self, window_size=hw.HPS_FPGA_RAM_SPAN, ibuf_depth=hw.IBUF_DEPTH):
+        self.phys_base = hw.HPS_FPGA_RAM_BASE
+        self._ddr = bytearray(window_size)
+        self.window = memoryview(self._ddr)
+        self.regs = [0] * 8
+        self.shadow = np.zeros((hw.NPU_MAT_SIZE, hw.NPU_MAT_SIZE), dtype=np.int8)
+        self.active = np.zeros_like(self.shadow)
+        self._read_port = _MsgdmaPort()
+        self._write_port = _MsgdmaPort()
+        self._write_queue = []
+        self._pending_rows = []
+        self._tx_rows = 0
+        self.ibuf_depth = ibuf_depth
+        self._ibuf = np.zeros((0, hw.NPU_MAT_SIZE), dtype=np.int8)
+        self._ibuf_overflow = False
+        self._replay_left = 0  # queued output rows up to the end of the running replay
+
+    # --------------------------------------------------------------------
+    # Bus interface
+    # --------------------------------------------------------------------
+    def read32(self, offset):
+        if offset in (hw.DDR_READ_ST_CSR_OFFSET, hw.DDR_WRITE_ST_CSR_OFFSET):
+            return 0  # never busy
+        reg = self._npu_reg(offset)
+        if reg == hw.REG_STATUS:
+            return 0
+        if reg == hw.REG_IBUF_CTRL:
+            return ((self.regs[reg] & hw.IBUF_CAPTURE)
+                    | (hw.IBUF_REPLAY if self._replay_left else 0)
+                    | (hw.IBUF_OVERFLOW if self._ibuf_overflow else 0))
+        if reg == hw.REG_IBUF_ROWS:
+            return len(self._ibuf)
+        if reg == hw.REG_IBUF_DEPTH:
+            return self.ibuf_depth
+        if reg is not None:
+            return self.regs[reg]
+        return 0
+
+    def write32(self, offset, value):
+        value &= 0xFFFFFFFF
+        if hw.DDR_READ_ST_DESC_OFFSET <= offset < hw.DDR_READ_ST_DESC_OFFSET + 0x10:
+            desc = self._read_port.write((offset - hw.DDR_READ_ST_DESC_OFFSET) >> 2, value)
+            if desc:
+                self._stream_in(desc[0], desc[2])
+            return
+        if hw.DDR_WRITE_ST_DESC_OFFSET <= offset < hw.DDR_WRITE_ST_DESC_OFFSET + 0x10:
+            desc = self._write_port.write((offset - hw.DDR_WRITE_ST_DESC_OFFSET) >> 2, value)
+            if desc:
+                self._write_queue.append([desc[1], desc[2]])
+                self._drain()
+            return
+        reg = self._npu_reg(offset)
+        if reg is None:
+            return
+        self.regs[reg] = value
+        if reg == hw.REG_WEIGHT_LATCH and (value & 1):
+            self.active = self.shadow.copy()
+        if reg == hw.REG_IBUF_CTRL and self.ibuf_depth:
+            if value & hw.IBUF_CAPTURE:
+                self._ibuf = self._ibuf[:0]
+                self._ibuf_overflow = False
+            elif value & hw.IBUF_REPLAY and len(self._ibuf) and not self._replay_left:
+                self._pending_rows.append(hw.golden_matmul(self._ibuf, self.active).astype(np.int32))
+                self._replay_left = sum(len(rows) for rows in self._pending_rows)
+                self._drain()
+
+    def close(self):
+        self.window.release()
+
+    # --------------------------------------------------------------------
+    # Internal model
+    # --------------------------------------------------------------------
+    @staticmethod
+    def _npu_reg(offset):
+        rel = offset - hw.NPU_CTRL_OFFSET
+        if 0 <= rel < 0x20 and rel % 4 == 0:
+            return rel >> 2
+        return None
+
+    def _window_slice(self, phys_addr, length):
+        start = phys_addr - self.phys_base
+        if start < 0 or start + length > len(self._ddr):
+            raise ValueError(f"DMA access 0x{phys_addr:08x}+{length} outside DDR window")
+        return slice(start, start + length)
+
+    def _stream_in(self, src_addr, length):
+        flits = np.frombuffer(self._ddr[self._window_slice(src_addr, length)], dtype=np.int8)
+        flits = flits.reshape(-1, hw.NPU_MAT_SIZE)
+        load_weights = (self.regs[hw.REG_CTRL] >> 1) & 0x1
+        if load_weights:
+            # Each flit shifts one column in from the left (column 7 arrives first)
+            for flit in flits:
+                self.shadow[:, 1:] = self.shadow[:, :-1].copy()
+                self.shadow[:, 0] = flit
+        else:
+            if self.ibuf_depth and self.regs[hw.REG_IBUF_CTRL] & hw.IBUF_CAPTURE:
+                room = self.ibuf_depth - len(self._ibuf)
+                self._ibuf_overflow |= len(flits) > room
+                self._ibuf = np.concatenate([self._ibuf, flits[:room]])
+            self._pending_rows.append(hw.golden_matmul(flits, self.active).astype(np.int32))
+            self._drain()
+
+    def _drain(self):
+        while self._write_queue and self._pending_rows:
+            dst, remaining = self._write_queue[0]
+            rows = self._pending_rows[0]
+            seq_rows = self.regs[hw.REG_SEQ_ROWS]
+            take = min(len(rows), remaining // hw.NPU_OUT_ROW_BYTES)
+            if seq_rows > 0:
+                take = min(take, seq_rows - self._tx_rows)
+            image = hw.encode_output(rows[:take])
+            self._ddr[self._window_slice(dst, len(image))] = image
+            self._write_queue[0] = [dst + len(image), remaining - len(image)]
+            self._replay_left = max(0, self._replay_left - take)
+            if take == len(rows):
+                self._pending_rows.pop(0)
+            else:
+                self._pending_rows[0] = rows[take:]
+            # End on EOP: the serializer flags the last of seq_total_rows rows
+            self._tx_rows += take
+            eop = seq_rows > 0 and self._tx_rows >= seq_rows
+            if eop:
+                self._tx_rows = 0
+            if eop or self._write_queue[0][1] < hw.NPU_OUT_ROW_BYTES:
+                self._write_queue.pop(0)
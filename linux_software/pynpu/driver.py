@@ -0,0 +1,238 @@
+"""
+NPU control API (Python port of the helpers in linux_software/npu_test/main.c).
+
+Every function takes a device (DevMemDevice or Emulator) and only touches it
+through read32/write32, so the same code drives the board and the emulator.
+"""
+import os
+import time
+from collections import deque
+
+from . import hw
+
+# Streaming model: 4 output flits per row at 50MHz plus the array pipeline fill
+NPU_CLK_NS = 20
+NPU_CYCLES_PER_ROW = 4
+NPU_PIPELINE_CYCLES = 4 * hw.NPU_MAT_SIZE
+
+SPIN_ONLY_NS = 50000        # jobs predicted below this: pure spin
+WAKE_MARGIN_NS = 20000      # wake this early from the first sleep
+BACKOFF_MIN_NS = 1000
+BACKOFF_MAX_NS = 1000000    # backoff cap (1ms, or predicted / 16)
+TIMEOUT_MIN_NS = 100000000  # never time out before 100ms
+TIMEOUT_FACTOR = 16
+
+
+# ============================================================================
+# Timing & Stage Instrumentation
+# ============================================================================
+STAGES = ("format", "push", "weight_dma", "input_dma", "compute", "parse")
+STAGE_WINDOW = 1024
+
+
+class StageStats:
+    """Rolling window of the most recent samples per stage (p50/p99 on demand)."""
+
+    def __init__(self, window=STAGE_WINDOW):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.samples = {s: deque(maxlen=self.window) for s in STAGES}
+        self.count = dict.fromkeys(STAGES, 0)
+        self.max_ns = dict.fromkeys(STAGES, 0)
+
+    def record(self, stage, ns):
+        self.samples[stage].append(ns)
+        self.count[stage] += 1
+        self.max_ns[stage] = max(self.max_ns[stage], ns)
+
+    def lap(self, stage, mark):
+        """Record the time since `mark` into `stage`; returns the new mark."""
+        now = time.monotonic_ns()
+        self.record(stage, now - mark)
+        return now
+
+    def summary(self):
+        out = {}
+        for s in STAGES:
+            if not self.samples[s]:
+                continue
+            ordered = sorted(self.samples[s])
+            n = len(ordered)
+            out[s] = {"count": self.count[s], "p50_ns": ordered[(n - 1) // 2],
+                      "p99_ns": ordered[(n - 1) * 99 // 100], "max_ns": self.max_ns[s]}
+        return out
+
+    def report(self):
+        lines = [f"=== Per-Stage Latency (last {self.window} samples, us) ===",
+                 f"{'stage':<11} {'count':>8} {'p50':>10} {'p99':>10} {'max':>10}"]
+        for s, h in self.summary().items():
+            lines.append(f"{s:<11} {h['count']:>8} {h['p50_ns'] / 1e3:>10.3f} "
+                         f"{h['p99_ns'] / 1e3:>10.3f} {h['max_ns'] / 1e3:>10.3f}")
+        return "\n".join(lines)
+
+
+# Shared by every runtime path (plans, MLPExecutor, HybridMatmul, Broker)
+stages = StageStats()
+
+
+# ============================================================================
+# MSGDMA Helpers
+# ============================================================================
+def msgdma_init(dev, csr_offset):
+    dev.write32(csr_offset + 0x00, 0xFFFFFFFF)
+    dev.write32(csr_offset + 0x04, 0x00000000)
+
+
+def msgdma_read_stream_push(dev, src_addr, length):
+    desc = hw.DDR_READ_ST_DESC_OFFSET
+    dev.write32(desc + 0x00, src_addr)
+    dev.write32(desc + 0x04, 0x00000000)
+    dev.write32(desc + 0x08, length)
+    dev.write32(desc + 0x0C, hw.MSGDMA_READ_CTRL)  # GO | GEN_EOP(9) | GEN_SOP(8)
+
+
+def msgdma_write_stream_push(dev, dst_addr, length):
+    desc = hw.DDR_WRITE_ST_DESC_OFFSET
+    dev.write32(desc + 0x00, 0x00000000)
+    dev.write32(desc + 0x04, dst_addr)
+    dev.write32(desc + 0x08, length)
+    dev.write32(desc + 0x0C, hw.MSGDMA_WRITE_CTRL)  # GO | End on EOP(12)
+
+
+def msgdma_busy(dev, csr_offset):
+    return (dev.read32(csr_offset) & hw.MSGDMA_CSR_BUSY) != 0
+
+
+# ============================================================================
+# NPU Register Access
+# ============================================================================
+def npu_write_reg(dev, reg, value):
+    dev.write32(hw.NPU_CTRL_OFFSET + reg * 4, value)
+
+
+def npu_read_reg(dev, reg):
+    return dev.read32(hw.NPU_CTRL_OFFSET + reg * 4)
+
+
+def npu_busy(dev):
+    return (npu_read_reg(dev, hw.REG_STATUS) & 0x01) != 0
+
+
+# ============================================================================
+# NPU Control API
+# ============================================================================
+def npu_init(dev):
+    msgdma_init(dev, hw.DDR_READ_ST_CSR_OFFSET)
+    msgdma_init(dev, hw.DDR_WRITE_ST_CSR_OFFSET)
+
+
+def predict_ns(rows):
+    return (NPU_PIPELINE_CYCLES + rows * NPU_CYCLES_PER_ROW) * NPU_CLK_NS
+
+
+def wait_idle(dev, offset, mask, predicted_ns):
+    """
+    Poll until (read32(offset) & mask) == 0, the same strategy as npu_wait_idle()
+    in main.c: spin for short jobs, otherwise sleep until just before the
+    predicted completion and back off exponentially, capped at predicted / 16
+    so a late poll adds little latency. Raises TimeoutError.
+    """
+    start = time.monotonic_ns()
+    timeout = max(TIMEOUT_MIN_NS, predicted_ns * TIMEOUT_FACTOR)
+    if not dev.read32(offset) & mask:
+        return
+    if predicted_ns > SPIN_ONLY_NS:
+        time.sleep((predicted_ns - WAKE_MARGIN_NS) / 1e9)
+        spin_until = time.monotonic_ns() + 2 * WAKE_MARGIN_NS
+    else:
+        spin_until = start + timeout + 1  # short job: never yield
+    backoff = BACKOFF_MIN_NS
+    backoff_max = min(BACKOFF_MAX_NS, predicted_ns // 16)
+    while dev.read32(offset) & mask:
+        now = time.monotonic_ns()
+        if now - start > timeout:
+            raise TimeoutError(f"NPU register 0x{offset:05x} still busy after {(now - start) / 1e6:.1f} ms")
+        if now < spin_until:
+            continue
+        os.sched_yield()
+        time.sleep(backoff / 1e9)
+        backoff = min(backoff * 2, backoff_max)
+
+
+def npu_wait_read(dev, rows=hw.NPU_MAT_SIZE):
+    # Wait for MSGDMA Read Status to be Idle, then the NPU sequencer
+    mark = time.monotonic_ns()
+    predicted = predict_ns(rows)
+    wait_idle(dev, hw.DDR_READ_ST_CSR_OFFSET, hw.MSGDMA_CSR_BUSY, predicted)
+    wait_idle(dev, hw.NPU_CTRL_OFFSET + hw.REG_STATUS * 4, 0x01, predicted)
+    stages.lap("weight_dma", mark)
+
+
+def npu_latch_weights(dev):
+    npu_write_reg(dev, hw.REG_WEIGHT_LATCH, 1)
+    npu_write_reg(dev, hw.REG_WEIGHT_LATCH, 0)
+
+
+def npu_load_weights(dev, weights_addr, num_matrices=1):
+    mark = time.monotonic_ns()
+    npu_write_reg(dev, hw.REG_CTRL, hw.CTRL_LOAD_WEIGHTS)
+    msgdma_read_stream_push(dev, weights_addr, hw.NPU_MAT_BYTES * num_matrices)
+    stages.lap("push", mark)
+    npu_wait_read(dev, hw.NPU_MAT_SIZE * num_matrices)
+    npu_latch_weights(dev)
+
+
+def npu_get_rows(dev, dst_addr, rows):
+    msgdma_write_stream_push(dev, dst_addr, hw.NPU_OUT_ROW_BYTES * rows)
+
+
+def npu_load_rows(dev, inputs_addr, rows):
+    npu_write_reg(dev, hw.REG_CTRL, hw.CTRL_EXECUTE)
+    msgdma_read_stream_push(dev, inputs_addr, hw.NPU_ROW_BYTES * rows)
+
+
+def npu_wait_execution(dev, rows):
+    # The input stream finishes a pipeline depth before the last output row;
+    # splitting the wait there gives the input_dma / compute stage times
+    mark = time.monotonic_ns()
+    wait_idle(dev, hw.DDR_READ_ST_CSR_OFFSET, hw.MSGDMA_CSR_BUSY, predict_ns(rows))
+    mark = stages.lap("input_dma", mark)
+    # Wait for MSGDMA Write Status to be Idle, then the NPU sequencer
+    wait_idle(dev, hw.DDR_WRITE_ST_CSR_OFFSET, hw.MSGDMA_CSR_BUSY, predict_ns(0))
+    wait_idle(dev, hw.NPU_CTRL_OFFSET + hw.REG_STATUS * 4, 0x01, predict_ns(0))
+    stages.lap("compute", mark)
+
+
+def npu_run_rows(dev, inputs_addr, outputs_addr, rows):
+    """Stream `rows` input rows through the latched weights (one EOP-terminated batch)."""
+    mark = time.monotonic_ns()
+    npu_write_reg(dev, hw.REG_SEQ_ROWS, rows)
+    npu_get_rows(dev, outputs_addr, rows)
+    npu_load_rows(dev, inputs_addr, rows)
+    stages.lap("push", mark)
+    npu_wait_execution(dev, rows)
+
+
+def npu_ibuf_depth(dev):
+    """Rows the on-chip input buffer holds (0 when npu_unit is built without it)."""
+    return npu_read_reg(dev, hw.REG_IBUF_DEPTH)
+
+
+def npu_capture_rows(dev, inputs_addr, outputs_addr, rows):
+    """npu_run_rows() that also records the input rows in the on-chip input buffer."""
+    npu_write_reg(dev, hw.REG_IBUF_CTRL, hw.IBUF_CAPTURE)
+    npu_run_rows(dev, inputs_addr, outputs_addr, rows)
+    npu_write_reg(dev, hw.REG_IBUF_CTRL, 0)
+
+
+def npu_replay_rows(dev, outputs_addr, rows):
+    """Stream the captured rows through the latched weights again, without input DMA."""
+    mark = time.monotonic_ns()
+    npu_write_reg(dev, hw.REG_SEQ_ROWS, rows)
+    npu_get_rows(dev, outputs_addr, rows)
+    npu_write_reg(dev, hw.REG_CTRL, hw.CTRL_EXECUTE)
+    npu_write_reg(dev, hw.REG_IBUF_CTRL, hw.IBUF_REPLAY)
+    stages.lap("push", mark)
+    npu_wait_execution(dev, rows)
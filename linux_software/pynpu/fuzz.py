@@ -0,0 +1,220 @@
+"""
+Differential fuzzing support shared by the cocotb harness (sim/test_fuzz.py)
+and the host-side tests.
+
+A Case is one weight tile, a batch of input rows and two handshake schedules
+(st_sink_valid and st_source_ready, repeated cyclically). golden_flits() is the
+vectorized NumPy reference for the exact flit stream, shrink_candidates()
+yields strictly simpler variants of a failing case and shrink_search() drives
+the delta-debugging loop for any (sync or async) predicate.
+"""
+import json
+
+import numpy as np
+
+from . import hw
+from .cycle_model import FLITS_PER_ROW, row_flits
+
+INT8_MIN, INT8_MAX = -128, 127
+
+
+class Case:
+    def __init__(self, weights, inputs, sink_valid=(1,), source_ready=(1,), seed=None):
+        self.weights = np.asarray(weights, dtype=np.int8).reshape(hw.NPU_MAT_SIZE, hw.NPU_MAT_SIZE)
+        self.inputs = np.asarray(inputs, dtype=np.int8).reshape(-1, hw.NPU_MAT_SIZE)
+        self.sink_valid = [int(v) for v in sink_valid]
+        self.source_ready = [int(v) for v in source_ready]
+        self.seed = seed
+
+    @property
+    def rows(self):
+        return len(self.inputs)
+
+    def size(self):
+        """Ordering used by the shrinker: fewer rows, fewer non-zeros, shorter schedules."""
+        return (self.rows, int(np.count_nonzero(self.weights)) + int(np.count_nonzero(self.inputs)),
+                len(self.sink_valid) + len(self.source_ready) - sum(self.sink_valid) - sum(self.source_ready))
+
+    def to_json(self):
+        return json.dumps({
+            "seed": self.seed,
+            "weights": self.weights.tolist(),
+            "inputs": self.inputs.tolist(),
+            "sink_valid": self.sink_valid,
+            "source_ready": self.source_ready,
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        d = json.loads(text)
+        return cls(d["weights"], d["inputs"], d["sink_valid"], d["source_ready"], d.get("seed"))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write(self.to_json())
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_json(f.read())
+
+    def __repr__(self):
+        return (f"Case(rows={self.rows}, seed={self.seed}, "
+                f"sink_valid={self.sink_valid}, source_ready={self.source_ready})")
+
+
+# ============================================================================
+# Generation
+# ============================================================================
+def _int8_tensor(rng, shape):
+    """Full int8 range with a bias towards the values that stress sign handling."""
+    kind = rng.integers(0, 5)
+    if kind == 0:
+        return rng.integers(INT8_MIN, INT8_MAX + 1, size=shape, dtype=np.int16).astype(np.int8)
+    if kind == 1:  # extremes only: -128 * -128 sums hit the largest accumulations
+        return rng.choice(np.array([INT8_MIN, INT8_MAX], dtype=np.int8), size=shape)
+    if kind == 2:
+        return np.full(shape, INT8_MIN, dtype=np.int8)
+    if kind == 3:  # sparse
+        t = rng.integers(INT8_MIN, INT8_MAX + 1, size=shape, dtype=np.int16).astype(np.int8)
+        return np.where(rng.random(shape) < 0.8, 0, t).astype(np.int8)
+    return rng.choice(np.array([INT8_MIN, -1, 0, 1, INT8_MAX], dtype=np.int8), size=shape)
+
+
+def _schedule(rng):
+    """Handshake pattern: always on, random duty cycle, long bursts or a single pulse."""
+    kind = rng.integers(0, 5)
+    if kind == 0:
+        return [1]
+    if kind == 1:
+        p = rng.uniform(0.05, 0.95)
+        pattern = (rng.random(int(rng.integers(16, 257))) < p).astype(int).tolist()
+        return pattern if any(pattern) else [1]
+    if kind == 2:  # long stalls
+        return [1] * int(rng.integers(1, 40)) + [0] * int(rng.integers(1, 120))
+    if kind == 3:  # one beat every n cycles
+        return [1] + [0] * int(rng.integers(1, 12))
+    return [0] * int(rng.integers(1, 8)) + [1] * int(rng.integers(1, 4))
+
+
+def generate_case(rng, max_rows=256):
+    seed = int(rng.integers(0, 2**31))
+    local = np.random.default_rng(seed)
+    rows = int(local.integers(1, max_rows + 1)) if local.random() < 0.7 else int(local.integers(1, 17))
+    return Case(_int8_tensor(local, (hw.NPU_MAT_SIZE, hw.NPU_MAT_SIZE)),
+                _int8_tensor(local, (rows, hw.NPU_MAT_SIZE)),
+                _schedule(local), _schedule(local), seed=seed)
+
+
+# ============================================================================
+# Golden Model
+# ============================================================================
+def golden_flits(case, seq_total_rows=None):
+    """Expected (data, sop, eop) flit stream for a case starting at tx_row_count == 0."""
+    seq_rows = case.rows if seq_total_rows is None else seq_total_rows
+    data = row_flits(hw.golden_matmul(case.inputs, case.weights)).tolist()
+    n = len(data)
+    idx = np.arange(n)
+    row_in_seq = (idx // FLITS_PER_ROW) % seq_rows if seq_rows else idx // FLITS_PER_ROW
+    sop = (idx % FLITS_PER_ROW == 0) & (row_in_seq == 0)
+    eop = (idx % FLITS_PER_ROW == FLITS_PER_ROW - 1) & (row_in_seq == seq_rows - 1)
+    return list(zip(data, sop.tolist(), eop.tolist()))
+
+
+def first_mismatch(got, expected):
+    """Index of the first differing flit (or the shorter length), None if identical."""
+    for i, (g, e) in enumerate(zip(got, expected)):
+        if tuple(g) != tuple(e):
+            return i
+    if len(got) != len(expected):
+        return min(len(got), len(expected))
+    return None
+
+
+def describe_mismatch(got, expected):
+    i = first_mismatch(got, expected)
+    if i is None:
+        return "streams match"
+    g = got[i] if i < len(got) else None
+    e = expected[i] if i < len(expected) else None
+    return (f"flit {i} (row {i // FLITS_PER_ROW}, flit {i % FLITS_PER_ROW}): "
+            f"got {_fmt(g)}, expected {_fmt(e)}; {len(got)}/{len(expected)} flits captured")
+
+
+def _fmt(flit):
+    if flit is None:
+        return "<missing>"
+    data, sop, eop = flit
+    return f"0x{data:016x}{' SOP' if sop else ''}{' EOP' if eop else ''}"
+
+
+# ============================================================================
+# Shrinking
+# ============================================================================
+def shrink_candidates(case):
+    """Yield simpler variants of `case`, most aggressive first."""
+    rows = case.rows
+    # 1. Fewer rows: halves, then drop single rows
+    for keep in sorted({1, rows // 2, rows - 1}):
+        if 0 < keep < rows:
+            yield Case(case.weights, case.inputs[:keep], case.sink_valid, case.source_ready, case.seed)
+            yield Case(case.weights, case.inputs[rows - keep:], case.sink_valid, case.source_ready, case.seed)
+    # 2. Simpler handshakes
+    if case.source_ready != [1]:
+        yield Case(case.weights, case.inputs, case.sink_valid, [1], case.seed)
+    if case.sink_valid != [1]:
+        yield Case(case.weights, case.inputs, [1], case.source_ready, case.seed)
+    # 3. Zero out weight columns / rows, then individual values
+    for tensor in ("weights", "inputs"):
+        t = getattr(case, tensor)
+        for axis in (0, 1):
+            for i in range(t.shape[axis]):
+                idx = (i, slice(None)) if axis == 0 else (slice(None), i)
+                if np.any(t[idx]):
+                    simpler = t.copy()
+                    simpler[idx] = 0
+                    yield _with(case, tensor, simpler)
+        for pos in zip(*np.nonzero(t)):
+            simpler = t.copy()
+            simpler[pos] = 0 if abs(int(t[pos])) <= 1 else int(t[pos]) // 2
+            yield _with(case, tensor, simpler)
+
+
+def _with(case, tensor, value):
+    if tensor == "weights":
+        return Case(value, case.inputs, case.sink_valid, case.source_ready, case.seed)
+    return Case(case.weights, value, case.sink_valid, case.source_ready, case.seed)
+
+
+def shrink_search(case, max_attempts=2000):
+    """
+    Greedy delta-debugging as a generator, so sync and async predicates share it.
+
+    Yields candidate cases; send() back whether the candidate still fails. The
+    minimal failing case is the StopIteration value.
+    """
+    attempts = 0
+    progress = True
+    while progress and attempts < max_attempts:
+        progress = False
+        for cand in shrink_candidates(case):
+            attempts += 1
+            if (yield cand):
+                case = cand
+                progress = True
+                break
+            if attempts >= max_attempts:
+                break
+    return case
+
+
+def shrink(case, fails, max_attempts=2000):
+    """Greedy delta-debugging with a synchronous `fails(case) -> bool` predicate."""
+    search = shrink_search(case, max_attempts)
+    try:
+        cand = next(search)
+        while True:
+            cand = search.send(fails(cand))
+    except StopIteration as done:
+        return done.value
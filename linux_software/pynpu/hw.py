@@ -0,0 +1,106 @@
+"""
+Hardware constants and DDR data formatting for the NPU (8x8 systolic core).
+
+Mirrors the definitions in linux_software/npu_test/main.c and hw_addresses.h.
+All formatting helpers are vectorized NumPy equivalents of the C
+npu_format_inputs / npu_format_weights / npu_parse_output functions.
+"""
+import numpy as np
+
+# ==========================================
+# Bridge Offsets (Fixed Architecture)
+# ==========================================
+LWHPS2FPGA_BASE = 0xFF200000
+LWHPS2FPGA_SPAN = 0x00200000
+
+HPS_FPGA_RAM_BASE = 0x20000000
+HPS_FPGA_RAM_SPAN = 0x01000000  # 16MB Window
+
+# ==========================================
+# Component Offsets (Extracted from Qsys)
+# ==========================================
+DDR_READ_ST_CSR_OFFSET = 0x31000
+DDR_READ_ST_DESC_OFFSET = 0x31040
+DDR_WRITE_ST_CSR_OFFSET = 0x31020
+DDR_WRITE_ST_DESC_OFFSET = 0x31050
+NPU_CTRL_OFFSET = 0x00030000
+
+# ==========================================
+# npu_ctrl Register Map (word addresses)
+# ==========================================
+REG_CTRL = 0
+REG_STATUS = 1
+REG_IBUF_CTRL = 2
+REG_IBUF_ROWS = 3
+REG_IBUF_DEPTH = 4
+REG_SEQ_ROWS = 6
+REG_WEIGHT_LATCH = 7
+
+CTRL_LOAD_WEIGHTS = 0x00000003  # seq_start | seq_mode = 1
+CTRL_EXECUTE = 0x00000001       # seq_start | seq_mode = 0
+
+IBUF_CAPTURE = 1 << 0   # record input rows (writing 1 restarts the capture)
+IBUF_REPLAY = 1 << 1    # write: replay the captured rows, read: replay busy
+IBUF_OVERFLOW = 1 << 2  # read: capture saw more than IBUF_DEPTH rows
+IBUF_DEPTH = 1024       # npu_unit default (M10K rows)
+
+# ==========================================
+# MSGDMA Descriptor Control Bits
+# ==========================================
+MSGDMA_DESC_GO = 1 << 31
+MSGDMA_DESC_GEN_EOP = 1 << 9
+MSGDMA_DESC_GEN_SOP = 1 << 8
+MSGDMA_DESC_END_ON_EOP = 1 << 12
+
+MSGDMA_READ_CTRL = MSGDMA_DESC_GO | MSGDMA_DESC_GEN_EOP | MSGDMA_DESC_GEN_SOP  # 0x80000300
+MSGDMA_WRITE_CTRL = MSGDMA_DESC_GO | MSGDMA_DESC_END_ON_EOP                    # 0x80001000
+
+MSGDMA_CSR_BUSY = 0x01
+
+# ==========================================
+# Array Geometry
+# ==========================================
+NPU_MAT_SIZE = 8
+NPU_ROW_BYTES = NPU_MAT_SIZE              # one int8 input row = one 64-bit flit
+NPU_OUT_ROW_BYTES = NPU_MAT_SIZE * 4      # one int32 output row = four 64-bit flits
+NPU_MAT_BYTES = NPU_MAT_SIZE * NPU_ROW_BYTES
+NPU_OUT_BYTES = NPU_MAT_SIZE * NPU_OUT_ROW_BYTES
+
+# MSGDMA Maximum Transfer Length is 1MB (see verify_performance_cpu_vs_npu).
+# 4000 batches of 8 rows keeps the output descriptor safely below it.
+MAX_ROWS_PER_TRANSFER = 4000 * NPU_MAT_SIZE
+
+# The write MSGDMA lands each 256-bit row as eight 32-bit words with adjacent
+# words swapped and each word byte-reversed (npu_parse_output: c ^ 1, bswap32).
+OUT_WORD_ORDER = np.arange(NPU_MAT_SIZE) ^ 1
+
+
+def format_inputs(x):
+    """Format (rows, 8) int8 activations into the input stream image (8 bytes per row)."""
+    x = np.ascontiguousarray(x, dtype=np.int8)
+    assert x.ndim == 2 and x.shape[1] == NPU_MAT_SIZE, f"expected (rows, 8), got {x.shape}"
+    return x.tobytes()
+
+
+def format_weights(w):
+    """Format an 8x8 int8 weight tile into the column-shift stream image (column 7 first)."""
+    w = np.asarray(w, dtype=np.int8)
+    assert w.shape == (NPU_MAT_SIZE, NPU_MAT_SIZE), f"expected (8, 8), got {w.shape}"
+    return np.ascontiguousarray(w[:, ::-1].T).tobytes()
+
+
+def parse_output(buf, rows):
+    """Parse `rows` output rows written by the write MSGDMA into an int32 (rows, 8) array."""
+    raw = np.frombuffer(buf, dtype=">i4", count=rows * NPU_MAT_SIZE)
+    return raw.reshape(rows, NPU_MAT_SIZE)[:, OUT_WORD_ORDER].astype(np.int32)
+
+
+def encode_output(y):
+    """Inverse of parse_output: the DDR image the write MSGDMA produces for int32 (rows, 8)."""
+    y = np.asarray(y, dtype=np.int32)
+    return np.ascontiguousarray(y[:, OUT_WORD_ORDER]).astype(">i4").tobytes()
+
+
+def golden_matmul(x, w):
+    """Reference int8 x int8 -> int32 matmul matching the MAC PE sign extension."""
+    return np.matmul(np.asarray(x, dtype=np.int32), np.asarray(w, dtype=np.int32))
@@ -0,0 +1,126 @@
+"""
+Hybrid CPU + NPU execution of a batched int8 matmul.
+
+While the NPU streams its share of the rows, the Cortex-A9 would otherwise sit
+in npu_wait_execution. HybridMatmul gives the remaining rows to NumPy in a
+worker thread (the NPU wait sleeps and NumPy's integer matmul releases the GIL).
+
+The split balances both finish times: with throughputs r_npu and r_cpu
+(rows/s) the NPU gets B * r_npu / (r_npu + r_cpu) rows, rounded to whole
+8-row matrices. Throughputs start from the cycle model and a short CPU
+calibration and are then tracked with an EWMA of the measured rates, so the
+split follows the board, the load on the CPU and the weight shape. Batches too
+small to amortize the thread handoff run on the faster engine alone.
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import hw
+from .compiler import Linear, compile_graph
+from .cycle_model import model_latency
+
+ROW_GRANULE = hw.NPU_MAT_SIZE
+PLAN_BUCKET = 64          # NPU plans are cached per 64-row bucket
+SPLIT_OVERHEAD_S = 100e-6  # thread handoff + join, charged to a split run
+HISTORY = 32
+
+
+class HybridMatmul:
+    """y = x @ weight for int8 x (rows, K) and weight (K, N), split across NPU and CPU."""
+
+    def __init__(self, dev, weight, max_rows, alpha=0.25, npu_rate=None, cpu_rate=None):
+        self.dev = dev
+        self.weight = np.asarray(weight, dtype=np.int8)
+        self.max_rows = max_rows
+        self.alpha = alpha
+        self.history = deque(maxlen=HISTORY)
+        self._plans = {}
+        self._staged = False
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="npu-cpu-share")
+
+        if npu_rate is None:
+            k, n = self.weight.shape
+            npu_rate = max_rows / model_latency(k, n, max_rows, None)
+        self.npu_rate = npu_rate
+        self.cpu_rate = cpu_rate if cpu_rate is not None else self._calibrate_cpu()
+
+    def close(self):
+        self._pool.shutdown()
+
+    def _calibrate_cpu(self, rows=256):
+        x = np.zeros((rows, self.weight.shape[0]), dtype=np.int8)
+        hw.golden_matmul(x, self.weight)
+        start = time.perf_counter()
+        hw.golden_matmul(x, self.weight)
+        return rows / max(time.perf_counter() - start, 1e-9)
+
+    def _plan(self, rows):
+        bucket = -(-rows // PLAN_BUCKET) * PLAN_BUCKET
+        plan = self._plans.get(bucket)
+        if plan is None:
+            plan = compile_graph([Linear(self.weight)], input_shape=(self.weight.shape[0],),
+                                 batch=min(bucket, self.max_rows))
+            if not self._staged:
+                # Every bucket shares the same weight image at window offset 0
+                plan.stage(self.dev)
+                self._staged = True
+            self._plans[bucket] = plan
+        return plan
+
+    def split(self, rows):
+        """Rows given to the NPU for a batch of `rows` (the CPU takes the rest)."""
+        total = self.npu_rate + self.cpu_rate
+        t_npu = rows / self.npu_rate
+        t_cpu = rows / self.cpu_rate
+        t_split = rows / total + SPLIT_OVERHEAD_S
+        if t_split >= min(t_npu, t_cpu):
+            return rows if t_npu <= t_cpu else 0
+        npu_rows = int(round(rows * self.npu_rate / total / ROW_GRANULE)) * ROW_GRANULE
+        return min(max(npu_rows, 0), rows)
+
+    def _update(self, attr, rows, seconds):
+        if rows and seconds > 0:
+            rate = getattr(self, attr)
+            setattr(self, attr, (1 - self.alpha) * rate + self.alpha * rows / seconds)
+
+    def _cpu_share(self, x):
+        start = time.perf_counter()
+        y = hw.golden_matmul(x, self.weight)
+        return y, time.perf_counter() - start
+
+    def run(self, x):
+        x = np.asarray(x, dtype=np.int8)
+        k, n = self.weight.shape
+        if x.ndim != 2 or x.shape[1] != k:
+            raise ValueError(f"HybridMatmul expects (rows, {k}) inputs, got {x.shape}")
+        rows = x.shape[0]
+        if rows > self.max_rows:
+            raise ValueError(f"HybridMatmul was built for up to {self.max_rows} rows, got {rows}")
+        if rows == 0:
+            return np.zeros((0, n), dtype=np.int32)
+        npu_rows = self.split(rows)
+
+        start = time.perf_counter()
+        cpu_future = self._pool.submit(self._cpu_share, x[npu_rows:]) if npu_rows < rows else None
+
+        npu_s = 0.0
+        parts = []
+        if npu_rows:
+            t0 = time.perf_counter()
+            parts.append(self._plan(npu_rows).run(self.dev, x[:npu_rows]))
+            npu_s = time.perf_counter() - t0
+
+        cpu_s = 0.0
+        if cpu_future is not None:
+            y_cpu, cpu_s = cpu_future.result()
+            parts.append(y_cpu)
+        wall = time.perf_counter() - start
+
+        self._update("npu_rate", npu_rows, npu_s)
+        self._update("cpu_rate", rows - npu_rows, cpu_s)
+        self.history.append({"rows": rows, "npu_rows": npu_rows,
+                             "npu_s": npu_s, "cpu_s": cpu_s, "wall_s": wall})
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
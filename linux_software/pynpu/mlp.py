@@ -0,0 +1,107 @@
+"""
+Fused MLP execution with activations resident in the DDR window.
+
+MLPExecutor compiles a chain of Linear layers with compile_graph() and keeps
+NumPy views over each layer's input and output regions of the DMA window:
+
+    input  region: (k_tiles, rows, 8) int8      -> one row stream per K tile
+    output region: (n_tiles, k_tiles, rows, 8)  -> raw write-MSGDMA image
+
+Layer l's N tiles are exactly layer l+1's K tiles, so the partial-sum
+reduction, bias and requantization of one layer are computed in tile-major
+order and stored straight into the next layer's input region: no per-row
+parsing, no transposes and no separate formatting pass between layers.
+All weight tiles are staged once at construction.
+
+The array has no on-device requantization (y_out is int32 only), so the one
+host pass per layer boundary remains; with on-device requant the next input
+region could be written by the write MSGDMA directly.
+"""
+import time
+
+import numpy as np
+
+from . import driver, hw, ops
+from .compiler import Linear, compile_graph
+from .plan import execute_program
+
+
+class _ResidentLayer:
+    def __init__(self, dev, meta, program, biases):
+        rows, kt, nt = meta["rows"], meta["k_tiles"], meta["n_tiles"]
+        self.meta = meta
+        self.program = program
+        self.shift = meta["shift"]
+        self.relu = meta["relu"]
+        self.in_view = np.frombuffer(dev.window, dtype=np.int8, count=kt * rows * hw.NPU_MAT_SIZE,
+                                     offset=meta["in_offset"]).reshape(kt, rows, hw.NPU_MAT_SIZE)
+        self.out_view = np.frombuffer(dev.window, dtype=">i4", count=nt * kt * rows * hw.NPU_MAT_SIZE,
+                                      offset=meta["out_offset"]).reshape(nt, kt, rows, hw.NPU_MAT_SIZE)
+        bias = np.zeros(nt * hw.NPU_MAT_SIZE, dtype=np.int32)
+        start = meta["bias_index"]
+        bias[:meta["n"]] = biases[start:start + meta["n"]]
+        self.bias = bias.reshape(nt, 1, hw.NPU_MAT_SIZE)
+
+    def accumulate(self):
+        """Sum the K-tile partial products of every N tile: (n_tiles, rows, 8) int32."""
+        acc = self.out_view[..., hw.OUT_WORD_ORDER].sum(axis=1, dtype=np.int32)
+        acc += self.bias
+        return acc
+
+
+class MLPExecutor:
+    """Run a chain of Linear layers on one device with all weights staged up front."""
+
+    def __init__(self, dev, layers, batch):
+        for layer in layers:
+            if not isinstance(layer, Linear):
+                raise TypeError(f"MLPExecutor only chains Linear layers, got {type(layer).__name__}")
+        self.dev = dev
+        self.plan = compile_graph(layers, input_shape=(layers[0].weight.shape[0],), batch=batch)
+        self.plan.stage(dev)
+        self.layers = [
+            _ResidentLayer(dev, meta,
+                           self.plan.program[meta["prog_start"]:meta["prog_start"] + meta["prog_count"]],
+                           self.plan.biases)
+            for meta in self.plan.layers
+        ]
+
+    @property
+    def batch(self):
+        return self.plan.batch
+
+    def run(self, x):
+        """Run up to `batch` samples; returns the int32 (or requantized int8) last-layer output."""
+        x = np.asarray(x, dtype=np.int8)
+        k = self.layers[0].meta["k"]
+        if x.ndim != 2 or x.shape[1] != k:
+            raise ValueError(f"MLPExecutor expects (rows, {k}) inputs, got {x.shape}")
+        n = x.shape[0]
+        if n > self.batch:
+            raise ValueError(f"MLPExecutor was built for batch {self.batch}, got {n}")
+
+        mark = time.monotonic_ns()
+        first = self.layers[0]
+        kt = first.meta["k_tiles"]
+        # Single vectorized pass into the first layer's K-tile streams
+        first.in_view[:] = 0
+        first.in_view[:, :n, :] = ops.pad_cols(x, kt).reshape(n, kt, hw.NPU_MAT_SIZE).transpose(1, 0, 2)
+        driver.stages.lap("format", mark)
+
+        for layer, nxt in zip(self.layers, self.layers[1:] + [None]):
+            execute_program(self.dev, layer.program)
+            mark = time.monotonic_ns()
+            acc = layer.accumulate()
+            if nxt is not None:
+                # Requantize straight into the next layer's resident input streams
+                np.right_shift(acc, layer.shift, out=acc)
+                np.clip(acc, 0 if layer.relu else -128, 127, out=acc)
+                nxt.in_view[...] = acc
+            driver.stages.lap("parse", mark)
+
+        last = self.layers[-1]
+        out = acc.transpose(1, 0, 2).reshape(-1, last.meta["n_tiles"] * hw.NPU_MAT_SIZE)
+        out = out[:n, :last.meta["n"]]
+        if last.shift is None:
+            return np.maximum(out, 0) if last.relu else np.ascontiguousarray(out)
+        return ops.requantize(out, last.shift, last.relu)
@@ -0,0 +1,47 @@
+"""
+Host-side tensor operations around the NPU matmul (lowering and requantization).
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import hw
+
+
+def conv_output_hw(h, w, kh, kw, stride, padding):
+    return (h + 2 * padding - kh) // stride + 1, (w + 2 * padding - kw) // stride + 1
+
+
+def im2col(x, kh, kw, stride=1, padding=0):
+    """Lower an NCHW int8 tensor to (N*Ho*Wo, C*kh*kw) rows for a conv-as-matmul."""
+    n, c, _, _ = x.shape
+    if padding:
+        x = np.pad(x, ((0, 0), (0, 0), (padding, padding), (padding, padding)))
+    win = sliding_window_view(x, (kh, kw), axis=(2, 3))[:, :, ::stride, ::stride]
+    ho, wo = win.shape[2], win.shape[3]
+    return np.ascontiguousarray(win.transpose(0, 2, 3, 1, 4, 5)).reshape(n * ho * wo, c * kh * kw)
+
+
+def col2im(y, n, ho, wo):
+    """Reshape (N*Ho*Wo, Cout) matmul rows back to an NCHW tensor."""
+    return np.ascontiguousarray(y.reshape(n, ho, wo, -1).transpose(0, 3, 1, 2))
+
+
+def requantize(acc, shift, relu=False):
+    """Arithmetic right shift int32 accumulators back to int8 with saturation."""
+    out = np.right_shift(acc, shift) if shift else acc
+    lo = 0 if relu else -128
+    return np.clip(out, lo, 127).astype(np.int8)
+
+
+def pad_cols(x, tiles):
+    """Zero-pad the last axis of a 2D array to `tiles` * 8 columns."""
+    cols = tiles * hw.NPU_MAT_SIZE
+    if x.shape[1] == cols:
+        return x
+    out = np.zeros((x.shape[0], cols), dtype=x.dtype)
+    out[:, :x.shape[1]] = x
+    return out
+
+
+def num_tiles(size):
+    return -(-size // hw.NPU_MAT_SIZE)
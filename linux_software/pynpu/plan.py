@@ -0,0 +1,213 @@
+"""
+Serialized NPU execution plans.
+
+File layout (little-endian):
+
+    header   : magic "NPUPLAN\\0", version u32, section count u32
+    sections : (kind u32, reserved u32, offset u64, size u64) * count
+    WEIGHTS  : preformatted 8x8 weight tile images, page aligned
+    PROGRAM  : (opcode, a, b, c) u32 quads
+    BIASES   : int32 bias vectors of every layer
+    META     : UTF-8 JSON (batch, shapes, DDR window layout, per-layer tiling)
+
+load_plan() memory-maps the file and keeps zero-copy views of every section,
+so starting a process costs one mmap plus the copy of WEIGHTS into the DDR window.
+"""
+import json
+import mmap
+import struct
+import time
+
+import numpy as np
+
+from . import driver, hw, ops
+
+PLAN_MAGIC = b"NPUPLAN\0"
+PLAN_VERSION = 1
+
+SECTION_WEIGHTS = 1
+SECTION_PROGRAM = 2
+SECTION_BIASES = 3
+SECTION_META = 4
+
+_HEADER = struct.Struct("<8sII")
+_SECTION = struct.Struct("<IIQQ")
+_PAGE = 0x1000
+
+# Program opcodes (a, b, c operands; offsets are relative to the DDR window)
+OP_REG_WRITE = 1  # a: npu_ctrl word address, b: value
+OP_DMA_READ = 2   # a: window offset, b: length -> read MSGDMA descriptor
+OP_DMA_WRITE = 3  # a: window offset, b: length -> write MSGDMA descriptor
+OP_WAIT_READ = 4  # a: rows; read MSGDMA idle, then NPU idle
+OP_WAIT_EXEC = 5  # a: rows; write MSGDMA idle, then NPU idle
+
+
+def execute_program(dev, program):
+    """Replay a block of plan ops against a device."""
+    base = dev.phys_base
+    mark = time.monotonic_ns()
+    for op, a, b, _ in program.tolist():
+        if op == OP_REG_WRITE:
+            driver.npu_write_reg(dev, a, b)
+        elif op == OP_DMA_READ:
+            driver.msgdma_read_stream_push(dev, base + a, b)
+        elif op == OP_DMA_WRITE:
+            driver.msgdma_write_stream_push(dev, base + a, b)
+        elif op == OP_WAIT_READ:
+            driver.stages.lap("push", mark)
+            driver.npu_wait_read(dev, a)
+            mark = time.monotonic_ns()
+        elif op == OP_WAIT_EXEC:
+            driver.stages.lap("push", mark)
+            driver.npu_wait_execution(dev, a)
+            mark = time.monotonic_ns()
+        else:
+            raise ValueError(f"Unknown plan opcode {op}")
+
+
+class ExecutionPlan:
+    """A compiled graph: weight images, device program, biases and window layout."""
+
+    def __init__(self, weights, program, biases, meta, _mmap=None):
+        self.weights = weights
+        self.program = program
+        self.biases = biases
+        self.meta = meta
+        self._mmap = _mmap
+
+    @property
+    def batch(self):
+        return self.meta["batch"]
+
+    @property
+    def layers(self):
+        return self.meta["layers"]
+
+    # --------------------------------------------------------------------
+    # Serialization
+    # --------------------------------------------------------------------
+    def save(self, path):
+        meta = json.dumps(self.meta, separators=(",", ":")).encode("utf-8")
+        payloads = [
+            (SECTION_WEIGHTS, bytes(self.weights)),
+            (SECTION_PROGRAM, np.ascontiguousarray(self.program, dtype="<u4").tobytes()),
+            (SECTION_BIASES, np.ascontiguousarray(self.biases, dtype="<i4").tobytes()),
+            (SECTION_META, meta),
+        ]
+        offset = _HEADER.size + _SECTION.size * len(payloads)
+        table = []
+        for kind, data in payloads:
+            # Page-align the weights so the image can be copied straight from the page cache
+            align = _PAGE if kind == SECTION_WEIGHTS else 64
+            offset = (offset + align - 1) // align * align
+            table.append((kind, offset, len(data)))
+            offset += len(data)
+
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(PLAN_MAGIC, PLAN_VERSION, len(payloads)))
+            for kind, off, size in table:
+                f.write(_SECTION.pack(kind, 0, off, size))
+            for (kind, off, _), (_, data) in zip(table, payloads):
+                f.write(b"\0" * (off - f.tell()))
+                f.write(data)
+
+    def close(self):
+        if self._mmap is not None:
+            # Drop the views before unmapping, otherwise mmap.close() raises BufferError
+            self.weights = self.program = self.biases = None
+            self._mmap.close()
+            self._mmap = None
+
+    # --------------------------------------------------------------------
+    # Execution
+    # --------------------------------------------------------------------
+    def stage(self, dev):
+        """Reset the MSGDMA engines and copy all weight tiles into the DDR window."""
+        driver.npu_init(dev)
+        start = self.meta["weight_offset"]
+        dev.window[start:start + len(self.weights)] = self.weights
+
+    def run(self, dev, x):
+        """Run the graph on a staged device for up to `batch` samples."""
+        x = np.asarray(x, dtype=np.int8)
+        if list(x.shape[1:]) != self.meta["input_shape"]:
+            raise ValueError(f"Plan expects samples of shape {tuple(self.meta['input_shape'])}, "
+                             f"got {x.shape[1:]}")
+        n = x.shape[0]
+        if n > self.batch:
+            raise ValueError(f"Plan was compiled for batch {self.batch}, got {n}")
+        if n < self.batch:
+            x = np.concatenate([x, np.zeros((self.batch - n,) + x.shape[1:], dtype=np.int8)])
+
+        out = x
+        for layer in self.layers:
+            out = self._run_layer(dev, layer, out)
+        return out[:n]
+
+    def _run_layer(self, dev, layer, x):
+        rows, kt, nt = layer["rows"], layer["k_tiles"], layer["n_tiles"]
+        mark = time.monotonic_ns()
+        if layer["kind"] == "conv2d":
+            cols = ops.im2col(x, *layer["kernel"], layer["stride"], layer["padding"])
+        else:
+            cols = x.reshape(x.shape[0], -1)
+
+        # K tiles are laid out back to back so each one is a contiguous row stream
+        staged = ops.pad_cols(cols, kt).reshape(rows, kt, hw.NPU_MAT_SIZE).transpose(1, 0, 2)
+        image = np.ascontiguousarray(staged).tobytes()
+        start = layer["in_offset"]
+        dev.window[start:start + len(image)] = image
+        driver.stages.lap("format", mark)
+
+        begin = layer["prog_start"]
+        execute_program(dev, self.program[begin:begin + layer["prog_count"]])
+
+        mark = time.monotonic_ns()
+        out_bytes = kt * nt * rows * hw.NPU_OUT_ROW_BYTES
+        start = layer["out_offset"]
+        tiles = hw.parse_output(dev.window[start:start + out_bytes], kt * nt * rows)
+        acc = tiles.reshape(nt, kt, rows, hw.NPU_MAT_SIZE).sum(axis=1, dtype=np.int32)
+        acc = acc.transpose(1, 0, 2).reshape(rows, nt * hw.NPU_MAT_SIZE)[:, :layer["n"]]
+        bias = self.biases[layer["bias_index"]:layer["bias_index"] + layer["n"]]
+        acc = acc + bias
+
+        if layer["shift"] is None:
+            out = np.maximum(acc, 0) if layer["relu"] else acc
+        else:
+            out = ops.requantize(acc, layer["shift"], layer["relu"])
+        if layer["kind"] == "conv2d":
+            _, ho, wo = layer["out_shape"]
+            out = ops.col2im(out, self.batch, ho, wo)
+        driver.stages.lap("parse", mark)
+        return out
+
+
+def load_plan(path):
+    """Memory-map a plan file; all sections are zero-copy views into the mapping."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, count = _HEADER.unpack_from(mm, 0)
+    if magic != PLAN_MAGIC:
+        mm.close()
+        raise ValueError(f"{path}: not an NPU plan file")
+    if version != PLAN_VERSION:
+        mm.close()
+        raise ValueError(f"{path}: plan version {version}, runtime expects {PLAN_VERSION}")
+
+    sections = {}
+    for i in range(count):
+        kind, _, off, size = _SECTION.unpack_from(mm, _HEADER.size + i * _SECTION.size)
+        sections[kind] = (off, size)
+
+    view = memoryview(mm)
+    off, size = sections[SECTION_WEIGHTS]
+    weights = view[off:off + size]
+    off, size = sections[SECTION_PROGRAM]
+    program = np.frombuffer(mm, dtype="<u4", count=size // 4, offset=off).reshape(-1, 4)
+    off, size = sections[SECTION_BIASES]
+    biases = np.frombuffer(mm, dtype="<i4", count=size // 4, offset=off)
+    off, size = sections[SECTION_META]
+    meta = json.loads(bytes(view[off:off + size]).decode("utf-8"))
+    view.release()
+    return ExecutionPlan(weights, program, biases, meta, _mmap=mm)
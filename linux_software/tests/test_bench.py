@@ -0,0 +1,49 @@
+import copy
+import json
+
+from pynpu import bench
+
+
+def test_suite_and_regression_check(tmp_path):
+    report = bench.run_suite(shapes=[(8, 8), (16, 24)], rows_list=[8, 40], repeats=1,
+                             backends=("cpu", "model", "emulator"))
+    json.loads(json.dumps(report))  # results must be JSON serializable
+
+    backends = {r["backend"] for r in report["results"]}
+    assert backends == {"cpu", "model", "emulator"}
+    assert all(r["verified"] for r in report["results"] if r["backend"] == "emulator")
+    stalls = {r["stall"] for r in report["results"] if r["backend"] == "model"}
+    assert stalls == set(bench.STALL_PROFILES)
+
+    # A model result can only get slower when the output side stalls
+    by_stall = {r["stall"]: r["latency_s"] for r in report["results"]
+                if r["backend"] == "model" and (r["k"], r["n"], r["rows"]) == (16, 24, 40)}
+    assert by_stall["none"] < by_stall["half"] < by_stall["sparse"]
+
+    slower = copy.deepcopy(report)
+    victim = slower["results"][0]
+    victim["latency_s"] *= 1.5
+    assert bench.compare(report, report) == []
+    flagged = bench.compare(report, slower, threshold=0.2)
+    assert len(flagged) == 1 and flagged[0]["slowdown"] > 1.2
+
+    base, cur = tmp_path / "base.json", tmp_path / "cur.json"
+    base.write_text(json.dumps(report))
+    cur.write_text(json.dumps(slower))
+    assert bench.main(["compare", str(base), str(cur), "--threshold", "0.2"]) == 1
+    assert bench.main(["compare", str(base), str(base)]) == 0
+
+
+def test_hardware_backend_needs_the_board(tmp_path, monkeypatch):
+    assert "hardware" not in bench.DEFAULT_BACKENDS
+    opened = []
+    monkeypatch.setattr(bench, "DevMemDevice", lambda: opened.append(1))
+    model = tmp_path / "model"
+    monkeypatch.setattr(bench, "DEVICE_TREE_MODEL", str(model))
+    assert bench.open_hardware() is None  # no device tree at all
+    model.write_bytes(b"Some other ARM board\0")
+    assert bench.open_hardware() is None
+    assert opened == []
+    model.write_bytes(b"Terasic DE10-Nano\0")
+    bench.open_hardware()
+    assert opened == [1]
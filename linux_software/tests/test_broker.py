@@ -0,0 +1,277 @@
+import errno
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from pynpu import Emulator, broker as broker_mod, hw
+from pynpu.broker import Arena, Broker, BrokerClient
+
+
+def _int8(rng, shape):
+    return rng.integers(-128, 128, size=shape, dtype=np.int16).astype(np.int8)
+
+
+def _connect(broker, path, **kwargs):
+    """Connect a client while driving the broker's event loop from this thread."""
+    with ThreadPoolExecutor(1) as pool:
+        kwargs.setdefault("data_bytes", 1 << 20)
+        fut = pool.submit(BrokerClient, path, **kwargs)
+        while not fut.done():
+            broker.poll(0.01)
+        return fut.result()
+
+
+def test_broker_fairness_batching_and_errors(tmp_path):
+    path = str(tmp_path / "npu.sock")
+    rng = np.random.default_rng(32)
+    broker = Broker(Emulator(), path, quantum=512)
+    heavy = _connect(broker, path)
+    light = _connect(broker, path)
+    try:
+        with pytest.raises(RuntimeError):
+            Broker(Emulator(), path)  # the device is already owned
+
+        w = light.alloc((8, 8))
+        w[...] = _int8(rng, (8, 8))
+        heavy_x = [_int8(rng, (512, 8)) for _ in range(4)]
+        light_x = light.alloc((2, 8, 8))
+        light_x[...] = _int8(rng, (2, 8, 8))
+
+        heavy_jobs = [heavy.submit(x, w) for x in heavy_x]
+        light_jobs = [light.submit(x, w) for x in light_x]   # already in the arena: no copy
+        bad = light.submit(np.zeros((4, 8), np.int8), np.zeros((8, 8), np.int8))
+        light.arena.sq[bad % light.arena.slots]["w_off"] = 0  # points into the rings
+
+        # First round: one 512-row heavy job, and every light job rides along in the
+        # same weight batch instead of queueing behind the heavy backlog
+        assert broker.poll(0.1) == 4
+        assert broker.stats["batches"] == 1
+        for job, x in zip(light_jobs, light_x):
+            np.testing.assert_array_equal(light.wait(job, timeout=0), hw.golden_matmul(x, w))
+        with pytest.raises(OSError):
+            light.wait(bad, timeout=0)
+        assert sum(heavy.done(job) for job in heavy_jobs) == 1
+
+        while not all(heavy.done(job) for job in heavy_jobs):
+            broker.poll(0)
+        for job, x in zip(heavy_jobs, heavy_x):
+            np.testing.assert_array_equal(heavy.wait(job), hw.golden_matmul(x, w))
+
+        del w, light_x, x  # arena views must go before close()
+        light.close()
+        broker.poll(0.1)
+        assert list(broker.clients) == [heavy.client_id]
+    finally:
+        heavy.close()
+        broker.close()
+    assert not os.path.exists(path)
+
+
+class _FlakyEmulator(Emulator):
+    """Emulator whose next register read raises a `fail` exception (a hung or lost device)."""
+
+    fail = None
+
+    def read32(self, offset):
+        if self.fail is not None:
+            fail, self.fail = self.fail, None
+            raise fail("injected device error")
+        return super().read32(offset)
+
+
+def _errno(client, job):
+    with pytest.raises(OSError) as e:
+        client.wait(job, timeout=0)
+    return e.value.errno
+
+
+def test_broker_rejects_bad_jobs_at_fetch_and_survives_device_errors(tmp_path):
+    path = str(tmp_path / "npu.sock")
+    rng = np.random.default_rng(320)
+    dev = _FlakyEmulator()
+    broker = Broker(dev, path)
+    client = _connect(broker, path, data_bytes=8 << 20)
+    try:
+        w = _int8(rng, (8, 8))
+        x = _int8(rng, (16, 8))
+        sq = client.arena.sq
+        garbage = client.submit(x, w)
+        sq[garbage % client.arena.slots]["rows"] = 0xFFFFFFFF
+        empty = client.submit(x, w)
+        sq[empty % client.arena.slots]["n"] = 0
+        # Fits the arena but its K-tile partial sums do not fit the DDR window
+        big_x = client.alloc((56000, 64))
+        big_w = client.alloc((64, 8))
+        too_big = client.submit(big_x, big_w)
+        good = client.submit(x, w)
+
+        assert broker.poll(0.1) == 4
+        assert not any(c.queue for c in broker.clients.values())  # nothing left to spin on
+        assert _errno(client, garbage) == errno.EINVAL
+        assert _errno(client, empty) == errno.EINVAL
+        assert _errno(client, too_big) == errno.E2BIG
+        np.testing.assert_array_equal(client.wait(good, timeout=0), hw.golden_matmul(x, w))
+
+        # A device error fails that run only, and the weights are staged again
+        for fail, code in ((TimeoutError, errno.ETIMEDOUT), (OSError, errno.EIO)):
+            dev.fail = fail
+            job = client.submit(x, w)
+            broker.poll(0.1)
+            assert _errno(client, job) == code
+            assert broker._staged is None
+            job = client.submit(x, w)
+            broker.poll(0.1)
+            np.testing.assert_array_equal(client.wait(job, timeout=0), hw.golden_matmul(x, w))
+        assert broker.stats["device_errors"] == 2
+        del sq, big_x, big_w  # arena views must go before close()
+    finally:
+        client.close()
+        broker.close()
+
+
+def test_broker_handshake_checks(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        broker_mod._attach_shm("../../etc/passwd")
+    with pytest.raises(ValueError):
+        broker_mod._attach_shm("a/b")
+    link = f"npu-test-link-{os.getpid()}"
+    os.symlink("/etc/passwd", os.path.join("/dev/shm", link))
+    try:
+        with pytest.raises(OSError):
+            broker_mod._attach_shm(link)  # O_NOFOLLOW
+    finally:
+        os.unlink(os.path.join("/dev/shm", link))
+
+    monkeypatch.setattr(broker_mod, "HELLO_TIMEOUT", 0.2)
+    path = str(tmp_path / "npu.sock")
+    broker = Broker(Emulator(), path)
+    silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    evil = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    efds = [os.eventfd(0), os.eventfd(0)]
+    try:
+        silent.connect(path)
+        broker.poll(0)
+        # A connection that never says hello does not hold up anyone else
+        start = time.monotonic()
+        client = _connect(broker, path)
+        assert time.monotonic() - start < 0.2
+        client.close()
+
+        evil.connect(path)
+        hello = json.dumps({"shm": "../../etc/shadow", "slots": 4}).encode() + b"\n"
+        socket.send_fds(evil, [hello], efds)
+        evil.settimeout(1.0)
+        while broker._pending:
+            broker.poll(0.05)
+        assert "invalid shm name" in json.loads(evil.makefile("rb").readline())["error"]
+        silent.settimeout(1.0)
+        assert "timed out" in json.loads(silent.makefile("rb").readline())["error"]
+        assert not broker.clients
+    finally:
+        for fd in efds:
+            os.close(fd)
+        silent.close()
+        evil.close()
+        broker.close()
+
+
+def test_broker_survives_misbehaving_clients(tmp_path):
+    from multiprocessing import shared_memory
+
+    path = str(tmp_path / "npu.sock")
+    rng = np.random.default_rng(321)
+    broker = Broker(Emulator(), path, max_share=2.0)
+    shm = shared_memory.SharedMemory(create=True, size=Arena.required_size(4, 4096))
+    arena = Arena(shm.buf, 4)
+    arena.init_header()
+    good = _connect(broker, path, share=float("inf"))
+    open_fds = len(os.listdir("/proc/self/fd"))
+    try:
+        assert broker.clients[good.client_id].share == 2.0  # clamped to the broker's cap
+
+        def hello(fds, close=False):
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(path)
+            msg = json.dumps({"shm": shm.name, "slots": 4}).encode() + b"\n"
+            socket.send_fds(conn, [msg], fds)
+            for fd in fds:
+                os.close(fd)
+            if close:
+                conn.close()  # gone before the broker can reply
+                conn = None
+            while broker._pending or len(broker._sel.get_map()) < 2 + 2 * len(broker.clients):
+                broker.poll(0.01)
+            return conn
+
+        # Valid hello, then hang up: the reply fails and everything is released
+        hello([os.eventfd(0), os.eventfd(0)], close=True)
+        broker.poll(0.01)
+        assert list(broker.clients) == [good.client_id]
+
+        # A pipe is not an eventfd
+        r, w = os.pipe()
+        conn = hello([os.eventfd(0), r])
+        conn.settimeout(1.0)
+        assert "eventfd" in json.loads(conn.makefile("rb").readline())["error"]
+        conn.close()
+        os.close(w)
+        assert list(broker.clients) == [good.client_id]
+        assert len(os.listdir("/proc/self/fd")) == open_fds
+
+        # A saturated completion counter drops that client, not the broker
+        bad = _connect(broker, path)
+        w8 = _int8(rng, (8, 8))
+        os.eventfd_write(bad._complete_efd, 0xFFFFFFFFFFFFFFFE)
+        bad.submit(w8, w8)
+        job = good.submit(w8, w8)
+        for _ in range(3):
+            broker.poll(0.01)
+        assert list(broker.clients) == [good.client_id]
+        np.testing.assert_array_equal(good.wait(job, timeout=1), hw.golden_matmul(w8, w8))
+        bad._results.clear()
+        bad.close()
+    finally:
+        del arena
+        shm.close()
+        shm.unlink()
+        good.close()
+        broker.close()
+
+
+def _client_proc(path, seed, jobs):
+    rng = np.random.default_rng(seed)
+    client = BrokerClient(path, slots=4, data_bytes=1 << 20)
+    w = _int8(rng, (20, 12))
+    xs = [_int8(rng, (int(rng.integers(1, 100)), 20)) for _ in range(jobs)]
+    ids = [client.submit(x, w) for x in xs]  # more jobs than SQ slots
+    for job, x in zip(ids, xs):
+        assert np.array_equal(client.wait(job, timeout=10), hw.golden_matmul(x, w))
+    client.close()
+
+
+def test_broker_serves_multiple_processes(tmp_path):
+    path = str(tmp_path / "npu.sock")
+    broker = Broker(Emulator(), path)
+    # Fork the clients before the broker thread exists
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_client_proc, args=(path, seed, 10)) for seed in range(3)]
+    for p in procs:
+        p.start()
+    server = threading.Thread(target=broker.serve_forever)
+    server.start()
+    try:
+        for p in procs:
+            p.join(30)
+        assert [p.exitcode for p in procs] == [0, 0, 0]
+        assert broker.stats["jobs"] == 30
+    finally:
+        broker.shutdown()
+        server.join()
+        broker.close()
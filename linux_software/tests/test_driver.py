@@ -0,0 +1,172 @@
+import types
+
+import numpy as np
+import pytest
+
+from pynpu import Emulator, MLPExecutor, Linear, driver, hw
+
+TILES = 3
+ROWS = 40
+W_OFF, X_OFF, Y_OFF = 0x0, 0x1000, 0x2000
+
+
+def test_input_buffer_replay_across_weight_tiles(monkeypatch):
+    rng = np.random.default_rng(33)
+    w = rng.integers(-128, 128, size=(8, 8 * TILES), dtype=np.int16).astype(np.int8)
+    x = rng.integers(-128, 128, size=(ROWS, 8), dtype=np.int16).astype(np.int8)
+
+    read_bytes = []
+    push = driver.msgdma_read_stream_push
+    monkeypatch.setattr(driver, "msgdma_read_stream_push",
+                        lambda dev, addr, length: (read_bytes.append(length), push(dev, addr, length)))
+
+    def run(dev, use_ibuf):
+        read_bytes.clear()
+        base = dev.phys_base
+        for t in range(TILES):
+            dev.window[W_OFF + t * 64:W_OFF + (t + 1) * 64] = hw.format_weights(w[:, t * 8:(t + 1) * 8])
+        dev.window[X_OFF:X_OFF + ROWS * 8] = hw.format_inputs(x)
+        outputs = []
+        for t in range(TILES):
+            y_off = Y_OFF + t * ROWS * hw.NPU_OUT_ROW_BYTES
+            driver.npu_load_weights(dev, base + W_OFF + t * 64)
+            if not use_ibuf:
+                driver.npu_run_rows(dev, base + X_OFF, base + y_off, ROWS)
+            elif t == 0:
+                driver.npu_capture_rows(dev, base + X_OFF, base + y_off, ROWS)
+            else:
+                driver.npu_replay_rows(dev, base + y_off, ROWS)
+            outputs.append(hw.parse_output(dev.window[y_off:], ROWS))
+        input_bytes = sum(read_bytes) - TILES * hw.NPU_MAT_BYTES
+        return np.concatenate(outputs, axis=1), input_bytes
+
+    dev = Emulator(window_size=1 << 16)
+    assert driver.npu_ibuf_depth(dev) == hw.IBUF_DEPTH
+    y_stream, stream_bytes = run(dev, use_ibuf=False)
+    y_ibuf, ibuf_bytes = run(dev, use_ibuf=True)
+    expected = hw.golden_matmul(x, w)
+    np.testing.assert_array_equal(y_stream, expected)
+    np.testing.assert_array_equal(y_ibuf, expected)
+    assert stream_bytes == TILES * ibuf_bytes == TILES * ROWS * hw.NPU_ROW_BYTES
+    assert driver.npu_read_reg(dev, hw.REG_IBUF_ROWS) == ROWS
+    assert driver.npu_read_reg(dev, hw.REG_IBUF_CTRL) == 0
+
+    # Overflow keeps the first ibuf_depth rows and is cleared by a new capture
+    small = Emulator(window_size=1 << 16, ibuf_depth=16)
+    small.window[W_OFF:W_OFF + 64] = hw.format_weights(w[:, :8])
+    small.window[X_OFF:X_OFF + ROWS * 8] = hw.format_inputs(x)
+    driver.npu_load_weights(small, small.phys_base + W_OFF)
+    driver.npu_capture_rows(small, small.phys_base + X_OFF, small.phys_base + Y_OFF, ROWS)
+    assert driver.npu_read_reg(small, hw.REG_IBUF_ROWS) == 16
+    assert driver.npu_read_reg(small, hw.REG_IBUF_CTRL) == hw.IBUF_OVERFLOW
+    driver.npu_replay_rows(small, small.phys_base + Y_OFF, 16)
+    np.testing.assert_array_equal(hw.parse_output(small.window[Y_OFF:], 16), hw.golden_matmul(x[:16], w[:, :8]))
+    driver.npu_write_reg(small, hw.REG_IBUF_CTRL, hw.IBUF_CAPTURE)
+    assert driver.npu_read_reg(small, hw.REG_IBUF_ROWS) == 0
+    assert driver.npu_read_reg(small, hw.REG_IBUF_CTRL) == hw.IBUF_CAPTURE
+
+    # Restarting capture while a replay waits for its output leaves that replay intact
+    driver.npu_capture_rows(dev, dev.phys_base + X_OFF, dev.phys_base + Y_OFF, ROWS)
+    driver.npu_write_reg(dev, hw.REG_IBUF_CTRL, hw.IBUF_REPLAY)
+    driver.npu_write_reg(dev, hw.REG_IBUF_CTRL, hw.IBUF_CAPTURE)
+    assert driver.npu_read_reg(dev, hw.REG_IBUF_CTRL) == hw.IBUF_CAPTURE | hw.IBUF_REPLAY
+    assert driver.npu_read_reg(dev, hw.REG_IBUF_ROWS) == 0
+    driver.msgdma_write_stream_push(dev, dev.phys_base + Y_OFF, ROWS * hw.NPU_OUT_ROW_BYTES)
+    np.testing.assert_array_equal(hw.parse_output(dev.window[Y_OFF:], ROWS), expected[:, -8:])
+    assert driver.npu_read_reg(dev, hw.REG_IBUF_CTRL) == hw.IBUF_CAPTURE
+
+
+class _FakeClock:
+    """Deterministic monotonic clock; sleeping advances it instead of blocking."""
+
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+        self.yields = 0
+
+    def monotonic_ns(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(int(seconds * 1e9))
+        self.now += int(seconds * 1e9)
+
+    def sched_yield(self):
+        self.yields += 1
+
+
+class _BusyDevice:
+    """Reports busy for `busy_reads` register reads (forever if None); each read costs 100ns."""
+
+    def __init__(self, clock, busy_reads=None):
+        self.clock = clock
+        self.busy_reads = busy_reads
+        self.reads = 0
+
+    def read32(self, offset):
+        self.clock.now += 100
+        self.reads += 1
+        return 1 if self.busy_reads is None or self.reads <= self.busy_reads else 0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(driver, "time", types.SimpleNamespace(monotonic_ns=clock.monotonic_ns, sleep=clock.sleep))
+    monkeypatch.setattr(driver, "os", types.SimpleNamespace(sched_yield=clock.sched_yield))
+    return clock
+
+
+def test_wait_idle_spins_on_short_jobs(clock):
+    dev = _BusyDevice(clock, busy_reads=200)
+    driver.wait_idle(dev, 0, 1, driver.SPIN_ONLY_NS)
+    assert dev.reads == 201
+    assert clock.sleeps == [] and clock.yields == 0
+
+
+def test_wait_idle_sleeps_on_long_jobs(clock):
+    predicted = 2000000
+    # Still busy after the post-wake spin window: 10 more polls with backoff
+    dev = _BusyDevice(clock, busy_reads=1 + 2 * driver.WAKE_MARGIN_NS // 100 + 10)
+    driver.wait_idle(dev, 0, 1, predicted)
+    assert clock.sleeps[0] == predicted - driver.WAKE_MARGIN_NS
+    backoffs = clock.sleeps[1:]
+    assert backoffs and clock.yields == len(backoffs)
+    assert backoffs[0] == driver.BACKOFF_MIN_NS
+    assert max(backoffs) == predicted // 16
+
+
+def test_wait_idle_times_out(clock):
+    dev = _BusyDevice(clock)
+    with pytest.raises(TimeoutError):
+        driver.wait_idle(dev, 0, 1, driver.SPIN_ONLY_NS)
+    assert clock.now > driver.TIMEOUT_MIN_NS and clock.sleeps == []
+
+    clock.now = 0
+    with pytest.raises(TimeoutError):
+        driver.wait_idle(dev, 0, 1, 20000000)
+    assert clock.now > 20000000 * driver.TIMEOUT_FACTOR
+    assert max(clock.sleeps[1:]) == driver.BACKOFF_MAX_NS
+
+
+def test_stage_stats_cover_plan_execution():
+    driver.stages.reset()
+    rng = np.random.default_rng(27)
+    w = rng.integers(-128, 128, size=(16, 16), dtype=np.int16).astype(np.int8)
+    x = rng.integers(-128, 128, size=(32, 16), dtype=np.int16).astype(np.int8)
+    mlp = MLPExecutor(Emulator(), [Linear(w)], batch=32)
+    for _ in range(3):
+        mlp.run(x)
+    summary = driver.stages.summary()
+    assert set(summary) == set(driver.STAGES)
+    assert summary["format"]["count"] == summary["parse"]["count"] == 3
+    # 2 x 2 tiles per run: one weight load and one row stream each
+    assert summary["weight_dma"]["count"] == summary["compute"]["count"] == 12
+    for h in summary.values():
+        assert 0 <= h["p50_ns"] <= h["p99_ns"] <= h["max_ns"]
+    assert "p99" in driver.stages.report()
+
+    stats = driver.StageStats(window=4)
+    for ns in range(10):
+        stats.record("push", ns)
+    assert stats.summary()["push"] == {"count": 10, "p50_ns": 7, "p99_ns": 8, "max_ns": 9}
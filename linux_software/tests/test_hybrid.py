@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from pynpu import Emulator, HybridMatmul, hw
+
+
+def test_hybrid_split_matches_golden_and_adapts():
+    rng = np.random.default_rng(31)
+    w = rng.integers(-128, 128, size=(20, 12), dtype=np.int16).astype(np.int8)
+    hybrid = HybridMatmul(Emulator(), w, max_rows=512, npu_rate=1e6, cpu_rate=1e6)
+    try:
+        # Equal rates: half the rows each, rounded to whole 8-row matrices
+        assert hybrid.split(400) == 200
+        assert hybrid.split(1000) % hw.NPU_MAT_SIZE == 0
+        # Too small to amortize the thread handoff: one engine only
+        assert hybrid.split(8) in (0, 8)
+
+        for rows in (400, 37, 512, 1):
+            x = rng.integers(-128, 128, size=(rows, 20), dtype=np.int16).astype(np.int8)
+            np.testing.assert_array_equal(hybrid.run(x), hw.golden_matmul(x, w))
+        assert any(0 < h["npu_rows"] < h["rows"] for h in hybrid.history)
+
+        # Rates track measurements, and a faster CPU pulls work away from the NPU
+        assert hybrid.npu_rate != 1e6 and hybrid.cpu_rate != 1e6
+        hybrid.npu_rate = hybrid.cpu_rate = 1e6
+        before = hybrid.split(4096)
+        hybrid.cpu_rate = 3e6
+        assert 0 < hybrid.split(4096) < before
+
+        empty = hybrid.run(np.zeros((0, 20), dtype=np.int8))
+        assert empty.shape == (0, 12) and empty.dtype == np.int32
+        for npu_rate in (1e9, 1.0):  # NPU takes every row / CPU takes every row
+            hybrid.npu_rate = npu_rate
+            with pytest.raises(ValueError, match="inputs"):
+                hybrid.run(np.zeros((64, 19), dtype=np.int8))
+    finally:
+        hybrid.close()
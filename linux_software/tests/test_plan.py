@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from pynpu import Conv2d, Emulator, Linear, MLPExecutor, compile_graph, hw, load_plan, ops
+from pynpu.plan import PLAN_MAGIC
+
+
+def test_format_roundtrip():
+    rng = np.random.default_rng(0)
+    y = rng.integers(-2**31, 2**31, size=(16, 8), dtype=np.int64).astype(np.int32)
+    np.testing.assert_array_equal(hw.parse_output(hw.encode_output(y), 16), y)
+
+    # npu_format_weights: flit t carries column 7 - t, row r in byte r
+    w = np.arange(64, dtype=np.int8).reshape(8, 8)
+    image = np.frombuffer(hw.format_weights(w), dtype=np.int8).reshape(8, 8)
+    for t in range(8):
+        np.testing.assert_array_equal(image[t], w[:, 7 - t])
+
+
+def test_mlp_plan_roundtrip(tmp_path):
+    rng = np.random.default_rng(1)
+    layers = [
+        Linear(rng.integers(-128, 128, size=(20, 12), dtype=np.int8),
+               bias=rng.integers(-500, 500, size=12), shift=6, relu=True),
+        Linear(rng.integers(-128, 128, size=(12, 5), dtype=np.int8)),
+    ]
+    plan = compile_graph(layers, input_shape=(20,), batch=32)
+    path = tmp_path / "mlp.npuplan"
+    plan.save(path)
+    assert path.read_bytes()[:8] == PLAN_MAGIC
+
+    loaded = load_plan(path)
+    dev = Emulator()
+    loaded.stage(dev)
+    x = rng.integers(-128, 128, size=(29, 20), dtype=np.int8)
+    got = loaded.run(dev, x)
+    loaded.close()
+
+    h = ops.requantize(hw.golden_matmul(x, layers[0].weight) + layers[0].bias, 6, relu=True)
+    np.testing.assert_array_equal(got, hw.golden_matmul(h, layers[1].weight))
+
+
+def test_conv_plan():
+    rng = np.random.default_rng(2)
+    conv = Conv2d(rng.integers(-128, 128, size=(6, 3, 3, 3), dtype=np.int8),
+                  stride=2, padding=1, shift=8)
+    head = Linear(rng.integers(-128, 128, size=(6 * 4 * 4, 10), dtype=np.int8))
+    plan = compile_graph([conv, head], input_shape=(3, 8, 8), batch=4)
+
+    dev = Emulator()
+    plan.stage(dev)
+    x = rng.integers(-128, 128, size=(4, 3, 8, 8), dtype=np.int8)
+    got = plan.run(dev, x)
+
+    cols = ops.im2col(x, 3, 3, stride=2, padding=1)
+    feat = ops.requantize(hw.golden_matmul(cols, conv.weight.reshape(6, -1).T), 8)
+    feat = ops.col2im(feat, 4, 4, 4)
+    np.testing.assert_array_equal(got, hw.golden_matmul(feat.reshape(4, -1), head.weight))
+
+
+def test_plan_version_check(tmp_path):
+    plan = compile_graph([Linear(np.eye(8, dtype=np.int8))], input_shape=(8,), batch=8)
+    path = tmp_path / "eye.npuplan"
+    plan.save(path)
+    data = bytearray(path.read_bytes())
+    data[8] = 99
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="version"):
+        load_plan(path)
+
+
+def test_graph_checks_raise_value_error():
+    eye = np.eye(8, dtype=np.int8)
+    conv = Conv2d(np.zeros((4, 3, 3, 3), dtype=np.int8))
+    with pytest.raises(ValueError, match="Linear weight"):
+        Linear(np.zeros(8, dtype=np.int8))
+    with pytest.raises(ValueError, match="Conv2d weight"):
+        Conv2d(eye)
+    with pytest.raises(ValueError, match="input channels"):
+        compile_graph([conv], input_shape=(2, 8, 8), batch=1)
+    with pytest.raises(ValueError, match="inputs"):
+        compile_graph([Linear(eye)], input_shape=(9,), batch=1)
+    with pytest.raises(ValueError, match="batch"):
+        compile_graph([Linear(eye)], input_shape=(8,), batch=0)
+    with pytest.raises(ValueError, match="bias"):
+        compile_graph([Linear(eye, bias=np.zeros(3))], input_shape=(8,), batch=1)
+    with pytest.raises(ValueError, match="does not fit"):
+        compile_graph([Conv2d(np.zeros((4, 3, 5, 5), dtype=np.int8))], input_shape=(3, 3, 3), batch=1)
+    with pytest.raises(ValueError, match="stride"):
+        compile_graph([Conv2d(conv.weight, stride=0)], input_shape=(3, 8, 8), batch=1)
+    with pytest.raises(ValueError, match="padding"):
+        compile_graph([Conv2d(conv.weight, padding=-1)], input_shape=(3, 8, 8), batch=1)
+
+    plan = compile_graph([Linear(np.zeros((20, 8), dtype=np.int8))], input_shape=(20,), batch=16)
+    with pytest.raises(ValueError, match="shape"):
+        plan.run(Emulator(), np.zeros((16, 17), dtype=np.int8))
+
+
+def test_mlp_executor_matches_plan():
+    rng = np.random.default_rng(3)
+    layers = [
+        Linear(rng.integers(-128, 128, size=(30, 24), dtype=np.int8),
+               bias=rng.integers(-2000, 2000, size=24), shift=7, relu=True),
+        Linear(rng.integers(-128, 128, size=(24, 17), dtype=np.int8), shift=6),
+        Linear(rng.integers(-128, 128, size=(17, 4), dtype=np.int8), bias=np.arange(4)),
+    ]
+    x = rng.integers(-128, 128, size=(50, 30), dtype=np.int8)
+
+    dev = Emulator()
+    mlp = MLPExecutor(dev, layers, batch=64)
+    got = mlp.run(x)
+    again = mlp.run(x[:7])
+
+    ref_dev = Emulator()
+    plan = compile_graph(layers, input_shape=(30,), batch=64)
+    plan.stage(ref_dev)
+    np.testing.assert_array_equal(got, plan.run(ref_dev, x))
+    np.testing.assert_array_equal(again, got[:7])
+    with pytest.raises(ValueError, match="inputs"):
+        mlp.run(x[:, :29])
+    with pytest.raises(ValueError, match="inputs"):
+        mlp.run(x[0])
@@ -1,6 +1,8 @@
 `timescale 1ns / 1ps
 
-module npu_ctrl (
+module npu_ctrl #(
+    parameter IBUF_DEPTH = 0  // Reported in IBUF_DEPTH (0: no input row buffer)
+)(
     input  wire        clk,
     input  wire        rst_n,
 
@@ -20,6 +22,14 @@ module npu_ctrl (
     input  wire        seq_done,
     output reg         weight_latch_en,
 
+    // Input Row Buffer
+    output reg         ibuf_capture_en,
+    output reg         ibuf_capture_start,
+    output reg         ibuf_replay_start,
+    input  wire [31:0] ibuf_rows,
+    input  wire        ibuf_busy,
+    input  wire        ibuf_overflow,
+
     // Legacy MAC PE Interface
     output wire         pe_load_weight,
     output wire         pe_valid_in,
@@ -61,9 +71,14 @@ module npu_ctrl (
             seq_mode  <= 2'd0;
             seq_total_rows <= 32'd0;
             weight_latch_en <= 1'b0;
+            ibuf_capture_en <= 1'b0;
+            ibuf_capture_start <= 1'b0;
+            ibuf_replay_start <= 1'b0;
         end else begin
             seq_start <= 1'b0;
             weight_latch_en <= 1'b0;
+            ibuf_capture_start <= 1'b0;
+            ibuf_replay_start <= 1'b0;
 
             if (write && select_sys) begin
                 case (address[2:0])
@@ -71,6 +86,12 @@ module npu_ctrl (
                         seq_mode  <= writedata[2:1];
                         seq_start <= writedata[0];
                     end
+                    3'd2: begin
+                        // Writing CAPTURE=1 (re)starts capture from row 0
+                        ibuf_capture_en    <= writedata[0];
+                        ibuf_capture_start <= writedata[0];
+                        ibuf_replay_start  <= writedata[1];
+                    end
                     3'd6: seq_total_rows <= writedata;
                     3'd7: weight_latch_en <= writedata[0];
                     default: ;
@@ -92,6 +113,9 @@ module npu_ctrl (
                 case (address[2:0])
                     3'd0: sys_readdata <= {29'd0, seq_mode, 1'b0};
                     3'd1: sys_readdata <= {30'd0, seq_done, seq_busy};
+                    3'd2: sys_readdata <= {29'd0, ibuf_overflow, ibuf_busy, ibuf_capture_en};
+                    3'd3: sys_readdata <= ibuf_rows;
+                    3'd4: sys_readdata <= IBUF_DEPTH[31:0];
                     3'd6: sys_readdata <= seq_total_rows;
                     3'd7: sys_readdata <= {31'd0, weight_latch_en};
                     default: sys_readdata <= 32'd0;
@@ -1,6 +1,8 @@
 `timescale 1ns / 1ps
 
-module npu_stream_ctrl (
+module npu_stream_ctrl #(
+    parameter IBUF_DEPTH = 0  // Input row buffer depth in 64-bit rows (0: bufferless)
+)(
     input clk,
     input rst_n,
 
@@ -22,8 +24,17 @@ module npu_stream_ctrl (
 
     // NPU Global Configuration
     input  [31:0] seq_total_rows,
+    input         seq_load_weight, // seq_mode[0]: sink carries weights, not input rows
 
-    // Interface to NPU PE Array (Bufferless)
+    // Input Row Buffer Control (from npu_ctrl)
+    input         ibuf_capture_en,    // Record input rows while they stream in
+    input         ibuf_capture_start, // Pulse: restart capture from row 0
+    input         ibuf_replay_start,  // Pulse: stream the captured rows into the array
+    output [31:0] ibuf_rows,          // Rows captured so far
+    output        ibuf_busy,          // Replay in progress (sink is held off)
+    output        ibuf_overflow,      // Capture saw more rows than IBUF_DEPTH
+
+    // Interface to NPU PE Array
     // TODO: Connect these to MAC and accumulator
     output [63:0] pe_din,
     output        pe_valid_in,
@@ -35,13 +46,106 @@ module npu_stream_ctrl (
 );
 
     // =========================================================================
-    // Sink Control (Memory -> NPU)
+    // Sink Control (Memory -> NPU) with optional Input Row Buffer
     // =========================================================================
-    // Pass data directly to PE if valid. 
+    // IBUF_DEPTH == 0: pass data directly to PE if valid.
     // Backpressure: If PE is not ready, we drop st_sink_ready to 0.
-    assign pe_din = st_sink_data;
-    assign pe_valid_in = st_sink_valid;
-    assign st_sink_ready = pe_ready_in;
+    //
+    // IBUF_DEPTH > 0: an M10K buffer records the input rows accepted while
+    // capture is enabled (they still go straight into the array) and can replay
+    // them into the array again. When N > 8 the same rows are needed once per
+    // weight tile, so they cross the MSGDMA read stream only once:
+    //   capture on -> stream rows (tile 0) -> load + latch tile 1 -> replay -> ...
+    // During a replay st_sink_ready is held low and the sink is not used.
+    generate
+        if (IBUF_DEPTH == 0) begin : g_no_ibuf
+            assign pe_din        = st_sink_data;
+            assign pe_valid_in   = st_sink_valid;
+            assign st_sink_ready = pe_ready_in;
+            assign ibuf_rows     = 32'd0;
+            assign ibuf_busy     = 1'b0;
+            assign ibuf_overflow = 1'b0;
+        end else begin : g_ibuf
+            localparam AW = (IBUF_DEPTH > 1) ? $clog2(IBUF_DEPTH) : 1;
+            localparam [31:0] DEPTH = IBUF_DEPTH;
+
+            (* ramstyle = "M10K" *) reg [63:0] ibuf_mem [0:IBUF_DEPTH-1];
+            reg [31:0]   wr_count;      // Rows captured
+            reg          overflow;
+            reg [AW-1:0] rd_addr;
+            reg [31:0]   rd_issued;     // Rows read out of the buffer in this replay
+            reg [31:0]   replay_len;    // wr_count latched at replay start
+            reg          replay_active; // Rows left to read
+            reg [63:0]   rd_data;       // Registered M10K read port
+            reg          rd_valid;
+
+            wire replaying    = replay_active || rd_valid;
+            wire capture_fire = ibuf_capture_en && !seq_load_weight && st_sink_valid && st_sink_ready;
+            // Read the next row when the output register is empty or being consumed
+            wire rd_en        = replay_active && (!rd_valid || pe_ready_in);
+
+            assign pe_din        = replaying ? rd_data  : st_sink_data;
+            assign pe_valid_in   = replaying ? rd_valid : st_sink_valid;
+            assign st_sink_ready = replaying ? 1'b0     : pe_ready_in;
+            assign ibuf_rows     = wr_count;
+            assign ibuf_busy     = replaying;
+            assign ibuf_overflow = overflow;
+
+            // Memory ports without reset so they map onto M10K
+            always @(posedge clk) begin
+                if (capture_fire && (wr_count < DEPTH))
+                    ibuf_mem[wr_count[AW-1:0]] <= st_sink_data;
+            end
+
+            always @(posedge clk) begin
+                if (rd_en)
+                    rd_data <= ibuf_mem[rd_addr];
+            end
+
+            always @(posedge clk or negedge rst_n) begin
+                if (!rst_n) begin
+                    wr_count      <= 32'd0;
+                    overflow      <= 1'b0;
+                    rd_addr       <= {AW{1'b0}};
+                    rd_issued     <= 32'd0;
+                    replay_len    <= 32'd0;
+                    replay_active <= 1'b0;
+                    rd_valid      <= 1'b0;
+                end else begin
+                    // Capture
+                    if (ibuf_capture_start) begin
+                        wr_count <= 32'd0;
+                        overflow <= 1'b0;
+                    end else if (capture_fire) begin
+                        if (wr_count < DEPTH)
+                            wr_count <= wr_count + 1'b1;
+                        else
+                            overflow <= 1'b1;
+                    end
+
+                    // Replay (ignored while one is running or capture is restarting).
+                    // The length is latched so restarting capture mid-replay cannot
+                    // move the end point; capture cannot write until the replay ends.
+                    if (ibuf_replay_start && !replaying && !ibuf_capture_start) begin
+                        rd_addr       <= {AW{1'b0}};
+                        rd_issued     <= 32'd0;
+                        replay_len    <= wr_count;
+                        replay_active <= (wr_count != 32'd0);
+                    end else if (rd_en) begin
+                        rd_addr   <= rd_addr + 1'b1;
+                        rd_issued <= rd_issued + 1'b1;
+                        if (rd_issued == replay_len - 1'b1)
+                            replay_active <= 1'b0;
+                    end
+
+                    if (rd_en)
+                        rd_valid <= 1'b1;
+                    else if (pe_ready_in)
+                        rd_valid <= 1'b0;
+                end
+            end
+        end
+    endgenerate
 
     // TODO: Handling SOP/EOP to reset MAC accumulators or define matrix boundaries
     always @(posedge clk or negedge rst_n) begin
@@ -1,7 +1,8 @@
 `timescale 1ns / 1ps
 
 module npu_unit #(
-    parameter AXI_WIDTH = 32
+    parameter AXI_WIDTH = 32,
+    parameter IBUF_DEPTH = 1024  // On-chip input rows (M10K), 0 removes the buffer
 )(
     input  wire        clk,
     input  wire        rst_n,
@@ -49,6 +50,14 @@ module npu_unit #(
     wire        seq_done;
     wire        weight_latch_en;
 
+    // Control <-> Input Row Buffer
+    wire        ibuf_capture_en;
+    wire        ibuf_capture_start;
+    wire        ibuf_replay_start;
+    wire [31:0] ibuf_rows;
+    wire        ibuf_busy;
+    wire        ibuf_overflow;
+
     // The DMA and Sequencer wires have been removed as they are now handled by MSGDMA via Avalon-ST.
     // Control <-> NPU Stream (Mode Control etc.)
     // TODO: Connect seq_start or seq_mode to the stream controller if mode switching is needed.
@@ -63,7 +72,9 @@ module npu_unit #(
     wire [31:0] csr_pe_y_out;
     wire        csr_pe_valid_out;
 
-    npu_ctrl u_npu_ctrl (
+    npu_ctrl #(
+        .IBUF_DEPTH(IBUF_DEPTH)
+    ) u_npu_ctrl (
         .clk            (clk),
         .rst_n          (rst_n),
         .address        (avs_address),
@@ -79,6 +90,13 @@ module npu_unit #(
         .seq_busy       (seq_busy),
         .seq_done       (seq_done),
         .weight_latch_en(weight_latch_en),
+
+        .ibuf_capture_en   (ibuf_capture_en),
+        .ibuf_capture_start(ibuf_capture_start),
+        .ibuf_replay_start (ibuf_replay_start),
+        .ibuf_rows         (ibuf_rows),
+        .ibuf_busy         (ibuf_busy),
+        .ibuf_overflow     (ibuf_overflow),
         
         .pe_load_weight (csr_pe_load_weight),
         .pe_valid_in    (csr_pe_valid_in),
@@ -99,7 +117,9 @@ module npu_unit #(
     wire        pe_valid_out;
     wire        pe_ready_out;
 
-    npu_stream_ctrl u_npu_stream_ctrl (
+    npu_stream_ctrl #(
+        .IBUF_DEPTH(IBUF_DEPTH)
+    ) u_npu_stream_ctrl (
         .clk                     (clk),
         .rst_n                   (rst_n),
         
@@ -121,6 +141,15 @@ module npu_unit #(
 
         // NPU Global Configuration
         .seq_total_rows          (seq_total_rows),
+        .seq_load_weight         (seq_mode[0]),
+
+        // Input Row Buffer
+        .ibuf_capture_en         (ibuf_capture_en),
+        .ibuf_capture_start      (ibuf_capture_start),
+        .ibuf_replay_start       (ibuf_replay_start),
+        .ibuf_rows               (ibuf_rows),
+        .ibuf_busy               (ibuf_busy),
+        .ibuf_overflow           (ibuf_overflow),
 
         // NPU PE Interface
         .pe_din                  (pe_din),
@@ -0,0 +1,205 @@
+"""
+Differential fuzzing: npu_unit RTL vs the pynpu cycle model vs the NumPy golden model.
+
+Every case (random 8x8 weights, 1..256 input rows over the full int8 range
+including -128, random st_sink_valid / st_source_ready schedules) runs
+back to back in a single simulator invocation. Outputs are compared
+flit-for-flit including SOP/EOP, and the RTL's cycle count (first sink beat
+to last source flit) must stay within CYCLE_TOLERANCE of the cycle model.
+On a mismatch or a hang the case is shrunk against the RTL and the minimal
+reproducer is written to fuzz_repro_<seed>.json.
+
+    make -f Makefile_fuzz                               # FUZZ_CASES=200 FUZZ_SEED=2026
+    make -f Makefile_fuzz FUZZ_REPRO=fuzz_repro_123.json  # replay a reproducer
+"""
+import os
+import sys
+
+import cocotb
+from cocotb.triggers import Timer, RisingEdge
+from cocotb.clock import Clock
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "linux_software"))
+from pynpu import fuzz  # noqa: E402
+from pynpu.cycle_model import CycleModel  # noqa: E402
+
+N = 8
+FLITS_PER_ROW = 4
+IDLE_TIMEOUT = 2000  # cycles without a handshake before declaring a hang
+CYCLE_TOLERANCE = 0.02  # allowed |model - RTL| / RTL cycles per case
+CYCLE_SLACK = 4         # plus a few cycles for the elastic handshakes
+
+
+async def reset_dut(dut):
+    dut.rst_n.value = 0
+    dut.avs_write.value = 0
+    dut.avs_read.value = 0
+    dut.st_sink_valid.value = 0
+    dut.st_sink_startofpacket.value = 0
+    dut.st_sink_endofpacket.value = 0
+    dut.st_sink_empty.value = 0
+    dut.st_source_ready.value = 1
+    await Timer(20, unit="ns")
+    dut.rst_n.value = 1
+    await RisingEdge(dut.clk)
+
+
+async def avs_write(dut, addr, data):
+    dut.avs_address.value = addr
+    dut.avs_writedata.value = data
+    dut.avs_write.value = 1
+    await RisingEdge(dut.clk)
+    dut.avs_write.value = 0
+    await RisingEdge(dut.clk)
+
+
+async def send_scheduled(dut, words, valid_schedule):
+    """Drive the Avalon-ST sink, raising valid only on cycles the schedule allows."""
+    cycle = 0
+    i = 0
+    stalled = 0
+    while i < len(words):
+        valid = valid_schedule[cycle % len(valid_schedule)]
+        dut.st_sink_data.value = int(words[i])
+        dut.st_sink_valid.value = valid
+        dut.st_sink_startofpacket.value = 1 if i == 0 else 0
+        dut.st_sink_endofpacket.value = 1 if i == len(words) - 1 else 0
+        await RisingEdge(dut.clk)
+        cycle += 1
+        if valid and int(dut.st_sink_ready.value) == 1:
+            i += 1
+            stalled = 0
+        else:
+            stalled += 1
+            assert stalled < IDLE_TIMEOUT, f"Sink stalled for {stalled} cycles at word {i}"
+    dut.st_sink_valid.value = 0
+
+
+async def capture_scheduled(dut, expected_count, ready_schedule):
+    """
+    Drive st_source_ready from the schedule and capture (data, sop, eop) flits.
+    Returns (flits, cycles) with cycles counted up to the last captured flit.
+    """
+    captured = []
+    last = 0
+    cycle = 0
+    idle = 0
+    ready = ready_schedule[0]
+    dut.st_source_ready.value = ready
+    while len(captured) < expected_count and idle < IDLE_TIMEOUT:
+        await RisingEdge(dut.clk)
+        idle += 1
+        if ready and int(dut.st_source_valid.value) == 1:
+            captured.append((int(dut.st_source_data.value),
+                             int(dut.st_source_startofpacket.value) == 1,
+                             int(dut.st_source_endofpacket.value) == 1))
+            idle = 0
+            last = cycle + 1
+        cycle += 1
+        ready = ready_schedule[cycle % len(ready_schedule)]
+        dut.st_source_ready.value = ready
+    dut.st_source_ready.value = 1
+    return captured, last
+
+
+def weight_words(weights):
+    # Column 7 first, row r in byte r (see test_npu.py)
+    w = weights.astype(np.uint8).astype(np.uint64)
+    shifts = np.arange(N, dtype=np.uint64) * np.uint64(8)
+    return [int(np.bitwise_or.reduce(w[:, c] << shifts)) for c in range(N - 1, -1, -1)]
+
+
+def input_words(inputs):
+    return np.ascontiguousarray(inputs.astype(np.int8)).view("<u8").reshape(-1).tolist()
+
+
+async def run_case(dut, case):
+    """Load the case's weights and stream its inputs; returns (flits, cycles)."""
+    await avs_write(dut, 0, 2)  # seq_mode = Load Weight
+    await send_scheduled(dut, weight_words(case.weights), case.sink_valid)
+    for _ in range(30):
+        await RisingEdge(dut.clk)
+    await avs_write(dut, 7, 1)
+    await avs_write(dut, 7, 0)
+
+    await avs_write(dut, 0, 0)  # seq_mode = Execute
+    await avs_write(dut, 6, case.rows)
+
+    monitor = cocotb.start_soon(capture_scheduled(dut, case.rows * FLITS_PER_ROW, case.source_ready))
+    try:
+        await send_scheduled(dut, input_words(case.inputs), case.sink_valid)
+    except AssertionError:
+        monitor.cancel()  # don't leave it driving st_source_ready into the next case
+        raise
+    return await monitor
+
+
+async def rtl_fails(dut, case):
+    """Run a case on a freshly reset DUT (a failing case may leave the pipeline dirty)."""
+    await reset_dut(dut)
+    try:
+        got, _ = await run_case(dut, case)
+    except AssertionError:
+        return True  # sink hang
+    return fuzz.first_mismatch(got, fuzz.golden_flits(case)) is not None
+
+
+async def shrink_rtl(dut, case, max_attempts=300):
+    search = fuzz.shrink_search(case, max_attempts)
+    try:
+        cand = next(search)
+        while True:
+            cand = search.send(await rtl_fails(dut, cand))
+    except StopIteration as done:
+        return done.value
+
+
+@cocotb.test()
+async def test_fuzz_differential(dut):
+    """Randomized RTL / cycle model / golden model comparison with shrinking"""
+    cocotb.start_soon(Clock(dut.clk, 10, unit="ns").start())
+    await reset_dut(dut)
+
+    seed = int(os.environ.get("FUZZ_SEED", "2026"))
+    num_cases = int(os.environ.get("FUZZ_CASES", "200"))
+    repro = os.environ.get("FUZZ_REPRO")
+
+    if repro:
+        cases = [fuzz.Case.load(repro)]
+    else:
+        rng = np.random.default_rng(seed)
+        cases = [fuzz.generate_case(rng) for _ in range(num_cases)]
+
+    model = CycleModel()
+    total_flits = 0
+    worst_error = 0.0
+    for i, case in enumerate(cases):
+        expected = fuzz.golden_flits(case)
+
+        model.load_weights(case.weights, case.sink_valid)
+        model_flits, model_cycles = model.run(case.inputs, sink_valid=case.sink_valid,
+                                              source_ready=case.source_ready)
+        assert fuzz.first_mismatch(model_flits, expected) is None, \
+            f"Cycle model diverges from golden on {case}: {fuzz.describe_mismatch(model_flits, expected)}"
+
+        try:
+            got, rtl_cycles = await run_case(dut, case)
+            detail = None if fuzz.first_mismatch(got, expected) is None else fuzz.describe_mismatch(got, expected)
+        except AssertionError as e:
+            got, rtl_cycles, detail = [], 0, f"hang: {e}"
+        total_flits += len(got)
+        if detail is not None:
+            dut._log.error(f"Case {i} {case} failed: {detail}")
+            minimal = await shrink_rtl(dut, case)
+            path = minimal.save(f"fuzz_repro_{case.seed}.json")
+            dut._log.error(f"Minimal reproducer {minimal} written to {path}:\n{minimal.to_json()}")
+            assert False, f"RTL failure on case {i}: {detail} (reproducer: {path})"
+
+        error = abs(model_cycles - rtl_cycles)
+        worst_error = max(worst_error, error / rtl_cycles)
+        assert error <= CYCLE_TOLERANCE * rtl_cycles + CYCLE_SLACK, \
+            f"Cycle model off by {error} cycles on case {i} {case}: model {model_cycles}, RTL {rtl_cycles}"
+
+    dut._log.info(f"Fuzzing passed: {len(cases)} cases, {total_flits} flits compared (seed {seed}); "
+                  f"cycle model within {worst_error:.1%} of RTL")
@@ -0,0 +1,268 @@
+"""
+On-chip input row buffer: capture a block of input rows once, replay it per weight tile.
+
+An (R, 8) x (8, 8*T) matmul needs T weight tiles. Without the buffer the R
+input rows are streamed over the MSGDMA read path once per tile; with it they
+are captured during tile 0 and replayed from M10K for tiles 1..T-1. Both runs
+must produce identical results, and the input traffic seen on the Avalon-ST
+sink must drop by exactly the reuse factor T.
+
+    make -f Makefile_ibuf
+"""
+import cocotb
+from cocotb.triggers import Timer, RisingEdge, ReadOnly
+from cocotb.clock import Clock
+import numpy as np
+
+N = 8
+FLITS_PER_ROW = 4
+TILES = 4        # reuse factor
+ROWS = 48
+
+# npu_ctrl word addresses
+REG_CTRL = 0
+REG_IBUF_CTRL = 2
+REG_IBUF_ROWS = 3
+REG_IBUF_DEPTH = 4
+REG_SEQ_ROWS = 6
+REG_WEIGHT_LATCH = 7
+IBUF_CAPTURE = 1 << 0
+IBUF_REPLAY = 1 << 1   # write: start, read: busy
+IBUF_OVERFLOW = 1 << 2
+
+
+async def reset_dut(dut):
+    dut.rst_n.value = 0
+    dut.avs_write.value = 0
+    dut.avs_read.value = 0
+    dut.st_sink_valid.value = 0
+    dut.st_sink_startofpacket.value = 0
+    dut.st_sink_endofpacket.value = 0
+    dut.st_sink_empty.value = 0
+    dut.st_source_ready.value = 1
+    await Timer(20, unit="ns")
+    dut.rst_n.value = 1
+    await RisingEdge(dut.clk)
+
+
+async def avs_write(dut, addr, data):
+    dut.avs_address.value = addr
+    dut.avs_writedata.value = data
+    dut.avs_write.value = 1
+    await RisingEdge(dut.clk)
+    dut.avs_write.value = 0
+    await RisingEdge(dut.clk)
+
+
+async def avs_read(dut, addr):
+    dut.avs_address.value = addr
+    dut.avs_read.value = 1
+    await RisingEdge(dut.clk)
+    dut.avs_read.value = 0
+    while True:
+        await ReadOnly()
+        if int(dut.avs_readdatavalid.value) == 1:
+            value = int(dut.avs_readdata.value)
+            await RisingEdge(dut.clk)
+            return value
+        await RisingEdge(dut.clk)
+
+
+async def send_avalon_st(dut, words):
+    """Drive the sink; returns the number of accepted flits."""
+    for i, word in enumerate(words):
+        dut.st_sink_data.value = int(word)
+        dut.st_sink_valid.value = 1
+        dut.st_sink_startofpacket.value = 1 if i == 0 else 0
+        dut.st_sink_endofpacket.value = 1 if i == len(words) - 1 else 0
+        while True:
+            await RisingEdge(dut.clk)
+            if int(dut.st_sink_ready.value) == 1:
+                break
+    dut.st_sink_valid.value = 0
+    await RisingEdge(dut.clk)
+    return len(words)
+
+
+async def count_sink_beats(dut, counter):
+    """Count every accepted sink flit, i.e. the traffic of the MSGDMA read stream."""
+    while True:
+        await RisingEdge(dut.clk)
+        if int(dut.st_sink_valid.value) == 1 and int(dut.st_sink_ready.value) == 1:
+            counter[0] += 1
+
+
+async def capture_rows(dut, rows, ready_pattern):
+    """Collect `rows` output rows while toggling st_source_ready with the pattern."""
+    flits = []
+    cycle = 0
+    idle = 0
+    while len(flits) < rows * FLITS_PER_ROW and idle < 2000:
+        dut.st_source_ready.value = ready_pattern[cycle % len(ready_pattern)]
+        await RisingEdge(dut.clk)
+        if int(dut.st_source_valid.value) == 1 and int(dut.st_source_ready.value) == 1:
+            flits.append(int(dut.st_source_data.value))
+            idle = 0
+        else:
+            idle += 1
+        cycle += 1
+    dut.st_source_ready.value = 1
+    assert len(flits) == rows * FLITS_PER_ROW, f"Captured {len(flits)}/{rows * FLITS_PER_ROW} flits"
+    y = np.array(flits, dtype=np.uint64).view(np.int32).reshape(rows, N)
+    return y
+
+
+def weight_words(weights):
+    # Column 7 first, row r in byte r (see test_npu.py)
+    w = weights.astype(np.uint8).astype(np.uint64)
+    shifts = np.arange(N, dtype=np.uint64) * np.uint64(8)
+    return [int(np.bitwise_or.reduce(w[:, c] << shifts)) for c in range(N - 1, -1, -1)]
+
+
+def input_words(inputs):
+    return np.ascontiguousarray(inputs.astype(np.int8)).view("<u8").reshape(-1).tolist()
+
+
+async def load_tile(dut, weights):
+    await avs_write(dut, REG_CTRL, 2)  # seq_mode = Load Weight
+    await send_avalon_st(dut, weight_words(weights))
+    for _ in range(30):
+        await RisingEdge(dut.clk)
+    await avs_write(dut, REG_WEIGHT_LATCH, 1)
+    await avs_write(dut, REG_WEIGHT_LATCH, 0)
+    await avs_write(dut, REG_CTRL, 0)  # seq_mode = Execute
+    await avs_write(dut, REG_SEQ_ROWS, ROWS)
+
+
+async def run_tiles(dut, weights, inputs, use_ibuf, ready_pattern):
+    """Run every weight tile over the same inputs; returns (y, input flits, weight flits)."""
+    beats = [0]
+    counter = cocotb.start_soon(count_sink_beats(dut, beats))
+    weight_flits = 0
+    outputs = []
+    for t in range(TILES):
+        await load_tile(dut, weights[:, t * N:(t + 1) * N])
+        weight_flits += N
+        monitor = cocotb.start_soon(capture_rows(dut, ROWS, ready_pattern))
+        if use_ibuf and t > 0:
+            await avs_write(dut, REG_IBUF_CTRL, IBUF_REPLAY)  # also ends the capture
+        else:
+            if use_ibuf:
+                await avs_write(dut, REG_IBUF_CTRL, IBUF_CAPTURE)
+            await send_avalon_st(dut, input_words(inputs))
+        outputs.append(await monitor)
+        if use_ibuf and t == 0:
+            assert await avs_read(dut, REG_IBUF_ROWS) == ROWS
+    counter.cancel()
+    if use_ibuf:
+        status = await avs_read(dut, REG_IBUF_CTRL)
+        assert status & (IBUF_REPLAY | IBUF_OVERFLOW) == 0, f"IBUF_CTRL status 0x{status:x}"
+    return np.concatenate(outputs, axis=1), beats[0] - weight_flits, weight_flits
+
+
+@cocotb.test()
+async def test_ibuf_reuse(dut):
+    """Input DMA traffic drops by the reuse factor with capture/replay"""
+    cocotb.start_soon(Clock(dut.clk, 10, unit="ns").start())
+    await reset_dut(dut)
+
+    depth = await avs_read(dut, REG_IBUF_DEPTH)
+    dut._log.info(f"IBUF_DEPTH = {depth} rows")
+    assert depth >= ROWS, "npu_unit built without a large enough input row buffer"
+
+    rng = np.random.default_rng(33)
+    weights = rng.integers(-128, 128, size=(N, N * TILES)).astype(np.int8)
+    inputs = rng.integers(-128, 128, size=(ROWS, N)).astype(np.int8)
+    expected = inputs.astype(np.int32) @ weights.astype(np.int32)
+
+    # Stall the output side so the replay has to honour array backpressure
+    ready_pattern = [1, 1, 0]
+    y_stream, stream_in, stream_w = await run_tiles(dut, weights, inputs, False, ready_pattern)
+    y_ibuf, ibuf_in, ibuf_w = await run_tiles(dut, weights, inputs, True, ready_pattern)
+
+    np.testing.assert_array_equal(y_stream, expected, "Streaming result mismatch")
+    np.testing.assert_array_equal(y_ibuf, expected, "Replay result mismatch")
+
+    dut._log.info(f"Input flits: streaming {stream_in}, buffered {ibuf_in} "
+                  f"(weights {stream_w} in both); reuse factor {stream_in / ibuf_in:.1f}")
+    assert stream_in == TILES * ROWS
+    assert ibuf_in == ROWS
+    assert stream_in == TILES * ibuf_in
+    assert stream_w == ibuf_w == TILES * N
+
+
+@cocotb.test()
+async def test_ibuf_overflow(dut):
+    """Capturing more rows than IBUF_DEPTH keeps the first rows and flags overflow"""
+    cocotb.start_soon(Clock(dut.clk, 10, unit="ns").start())
+    await reset_dut(dut)
+
+    depth = await avs_read(dut, REG_IBUF_DEPTH)
+    rng = np.random.default_rng(34)
+    weights = rng.integers(-128, 128, size=(N, N)).astype(np.int8)
+    inputs = rng.integers(-128, 128, size=(depth + 3, N)).astype(np.int8)
+
+    await load_tile(dut, weights)
+    await avs_write(dut, REG_SEQ_ROWS, len(inputs))
+    await avs_write(dut, REG_IBUF_CTRL, IBUF_CAPTURE)
+    monitor = cocotb.start_soon(capture_rows(dut, len(inputs), [1]))
+    await send_avalon_st(dut, input_words(inputs))
+    await monitor
+
+    assert await avs_read(dut, REG_IBUF_ROWS) == depth
+    assert await avs_read(dut, REG_IBUF_CTRL) == IBUF_CAPTURE | IBUF_OVERFLOW
+
+    # Replay what fits
+    await avs_write(dut, REG_SEQ_ROWS, depth)
+    monitor = cocotb.start_soon(capture_rows(dut, depth, [1]))
+    await avs_write(dut, REG_IBUF_CTRL, IBUF_REPLAY)
+    y = await monitor
+    np.testing.assert_array_equal(y, inputs[:depth].astype(np.int32) @ weights.astype(np.int32))
+
+    # Restarting the capture clears the count and the overflow flag
+    await avs_write(dut, REG_IBUF_CTRL, IBUF_CAPTURE)
+    assert await avs_read(dut, REG_IBUF_ROWS) == 0
+    assert await avs_read(dut, REG_IBUF_CTRL) == IBUF_CAPTURE
+
+
+@cocotb.test()
+async def test_ibuf_capture_during_replay(dut):
+    """Restarting capture mid-replay neither stretches nor corrupts the running replay"""
+    cocotb.start_soon(Clock(dut.clk, 10, unit="ns").start())
+    await reset_dut(dut)
+
+    rng = np.random.default_rng(35)
+    weights = rng.integers(-128, 128, size=(N, N)).astype(np.int8)
+    inputs = rng.integers(-128, 128, size=(ROWS, N)).astype(np.int8)
+    expected = inputs.astype(np.int32) @ weights.astype(np.int32)
+
+    await load_tile(dut, weights)
+    await avs_write(dut, REG_IBUF_CTRL, IBUF_CAPTURE)
+    monitor = cocotb.start_soon(capture_rows(dut, ROWS, [1]))
+    await send_avalon_st(dut, input_words(inputs))
+    await monitor
+
+    # Hold the output so the replay is still running when capture restarts
+    dut.st_source_ready.value = 0
+    await avs_write(dut, REG_IBUF_CTRL, IBUF_REPLAY)
+    await avs_write(dut, REG_IBUF_CTRL, IBUF_CAPTURE)
+    assert await avs_read(dut, REG_IBUF_CTRL) == IBUF_CAPTURE | IBUF_REPLAY
+    assert await avs_read(dut, REG_IBUF_ROWS) == 0
+
+    y = await capture_rows(dut, ROWS, [1, 0])
+    np.testing.assert_array_equal(y, expected, "Replay result mismatch")
+    for _ in range(50):
+        await RisingEdge(dut.clk)
+    assert await avs_read(dut, REG_IBUF_CTRL) == IBUF_CAPTURE, "Replay did not end"
+    assert await avs_read(dut, REG_IBUF_ROWS) == 0
+
+    # The restarted capture takes the next stream and replays it
+    inputs = rng.integers(-128, 128, size=(ROWS, N)).astype(np.int8)
+    monitor = cocotb.start_soon(capture_rows(dut, ROWS, [1]))
+    await send_avalon_st(dut, input_words(inputs))
+    await monitor
+    assert await avs_read(dut, REG_IBUF_ROWS) == ROWS
+    monitor = cocotb.start_soon(capture_rows(dut, ROWS, [1]))
+    await avs_write(dut, REG_IBUF_CTRL, IBUF_REPLAY)
+    y = await monitor
+    np.testing.assert_array_equal(y, inputs.astype(np.int32) @ weights.astype(np.int32))